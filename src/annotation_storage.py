@@ -0,0 +1,192 @@
+import importlib.util
+import io
+import itertools
+import json
+import os
+from abc import abstractmethod
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class AnnotationStorage:
+
+    @abstractmethod
+    def read(self, file_path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        pass
+
+    @abstractmethod
+    def read_chunks(self, file_path, chunk_size, columns: Optional[List[str]] = None,
+                    start=0) -> Iterator[pd.DataFrame]:
+        pass
+
+    @abstractmethod
+    def write(self, data_frame: pd.DataFrame, file_path):
+        pass
+
+
+class CsvAnnotationStorage(AnnotationStorage):
+
+    def read(self, file_path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return pd.read_csv(file_path, usecols=columns)
+
+    def read_chunks(self, file_path, chunk_size, columns: Optional[List[str]] = None,
+                    start=0) -> Iterator[pd.DataFrame]:
+        with open(file_path, newline='') as csv_file:
+            column_names = pd.read_csv(io.StringIO(csv_file.readline())).columns
+            # Rows before start are skipped as lines, without parsing them. Annotations have no multiline values.
+            for _ in itertools.islice(csv_file, start):
+                pass
+
+            reader = pd.read_csv(csv_file, header=None, names=column_names, usecols=columns, chunksize=chunk_size)
+            try:
+                yield from reader
+            finally:
+                reader.close()
+
+    def write(self, data_frame: pd.DataFrame, file_path):
+        data_frame.to_csv(file_path)
+
+
+# Annotations are stored in a directory. Numeric columns are saved column-major in one memory-mappable
+# .npy file, so each column is contiguous on disk, every text column is saved in its own memory-mappable
+# fixed width string .npy file. Metadata json only describes columns.
+class NumpyAnnotationStorage(AnnotationStorage):
+    NUMERIC_COLUMNS_FILE_NAME = 'numeric_columns.npy'
+    TEXT_COLUMN_FILE_NAME = 'text_column_{0}.npy'
+    METADATA_FILE_NAME = 'metadata.json'
+
+    def read(self, file_path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        metadata, numeric_columns, text_columns = self._open(file_path, columns)
+        return self._read_rows(metadata, numeric_columns, text_columns, columns, slice(None))
+
+    def read_chunks(self, file_path, chunk_size, columns: Optional[List[str]] = None,
+                    start=0) -> Iterator[pd.DataFrame]:
+        # All columns are memory mapped, so only rows of current chunk are read from disk
+        metadata, numeric_columns, text_columns = self._open(file_path, columns)
+        for chunk_start in range(start, numeric_columns.shape[1], chunk_size):
+            yield self._read_rows(metadata, numeric_columns, text_columns, columns,
+                                  slice(chunk_start, chunk_start + chunk_size))
+
+    def _open(self, file_path, columns: Optional[List[str]]):
+        with open(os.path.join(file_path, self.METADATA_FILE_NAME)) as metadata_file:
+            metadata = json.load(metadata_file)
+
+        missing_columns = set(columns or []) - set(metadata['columns'])
+        if missing_columns:
+            raise ValueError(f'Columns {sorted(missing_columns)} not found in {file_path}')
+
+        numeric_columns = np.load(os.path.join(file_path, self.NUMERIC_COLUMNS_FILE_NAME), mmap_mode='r')
+
+        # Annotations written by earlier versions keep text columns as lists in metadata
+        text_columns = dict(metadata.get('text_columns', {}))
+        for column, text_column_file_name in metadata.get('text_column_files', {}).items():
+            text_columns[column] = np.load(os.path.join(file_path, text_column_file_name), mmap_mode='r')
+
+        return metadata, numeric_columns, text_columns
+
+    @staticmethod
+    def _read_rows(metadata, numeric_columns: np.ndarray, text_columns: dict, columns: Optional[List[str]],
+                   rows: slice) -> pd.DataFrame:
+        columns = columns if columns is not None else metadata['columns']
+        numeric_column_indices = {name: index for index, name in enumerate(metadata['numeric_columns'])}
+
+        data = {}
+        for column in [column for column in metadata['columns'] if column in columns]:
+            if column in numeric_column_indices:
+                values = numeric_columns[numeric_column_indices[column], rows]
+                data[column] = np.asarray(values, dtype=metadata['dtypes'][column])
+            else:
+                values = text_columns[column][rows]
+                data[column] = np.asarray(values).astype(object) if isinstance(values, np.ndarray) else values
+
+        return pd.DataFrame(data, columns=[column for column in metadata['columns'] if column in columns])
+
+    def write(self, data_frame: pd.DataFrame, file_path):
+        os.makedirs(file_path, exist_ok=True)
+
+        numeric_data_frame = data_frame.select_dtypes(include=np.number)
+        text_columns = [column for column in data_frame.columns if column not in numeric_data_frame.columns]
+        metadata = {
+            'columns': list(data_frame.columns),
+            'numeric_columns': list(numeric_data_frame.columns),
+            'dtypes': {column: str(dtype) for column, dtype in numeric_data_frame.dtypes.items()},
+            'text_column_files': {column: self.TEXT_COLUMN_FILE_NAME.format(index)
+                                  for index, column in enumerate(text_columns)}
+        }
+
+        np.save(os.path.join(file_path, self.NUMERIC_COLUMNS_FILE_NAME),
+                np.ascontiguousarray(numeric_data_frame.to_numpy(dtype=np.float64).T))
+        for column, text_column_file_name in metadata['text_column_files'].items():
+            np.save(os.path.join(file_path, text_column_file_name), data_frame[column].to_numpy(dtype=str))
+        with open(os.path.join(file_path, self.METADATA_FILE_NAME), 'w') as metadata_file:
+            json.dump(metadata, metadata_file)
+
+
+class ParquetAnnotationStorage(AnnotationStorage):
+
+    def read(self, file_path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        self._check_engine_available()
+        return pd.read_parquet(file_path, columns=columns)
+
+    def read_chunks(self, file_path, chunk_size, columns: Optional[List[str]] = None,
+                    start=0) -> Iterator[pd.DataFrame]:
+        self._check_engine_available()
+        if importlib.util.find_spec('pyarrow') is not None:
+            import pyarrow.parquet as pq
+
+            chunks = pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns)
+        else:
+            import fastparquet
+
+            # fastparquet reads whole row groups, so chunk size is decided when file is written
+            chunks = fastparquet.ParquetFile(file_path).iter_row_groups(columns=columns)
+
+        # Chunks before start are skipped without converting them to data frames
+        for chunk in chunks:
+            if start >= len(chunk):
+                start -= len(chunk)
+                continue
+
+            chunk = chunk[start:] if start > 0 else chunk
+            start = 0
+            yield chunk if isinstance(chunk, pd.DataFrame) else chunk.to_pandas()
+
+    def write(self, data_frame: pd.DataFrame, file_path):
+        self._check_engine_available()
+        data_frame.to_parquet(file_path, index=False)
+
+    @staticmethod
+    def _check_engine_available():
+        if importlib.util.find_spec('pyarrow') is None and importlib.util.find_spec('fastparquet') is None:
+            raise ImportError('Parquet annotations require pyarrow or fastparquet to be installed')
+
+
+ANNOTATION_STORAGES = {
+    '.csv': CsvAnnotationStorage(),
+    '.npann': NumpyAnnotationStorage(),
+    '.parquet': ParquetAnnotationStorage()
+}
+
+
+def get_annotation_storage(file_path) -> AnnotationStorage:
+    extension = os.path.splitext(os.path.normpath(file_path))[-1].lower()
+    if extension not in ANNOTATION_STORAGES:
+        raise ValueError(f'Unsupported annotations format {extension}, '
+                         f'supported formats: {", ".join(ANNOTATION_STORAGES.keys())}')
+
+    return ANNOTATION_STORAGES[extension]
+
+
+def read_annotations(file_path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return get_annotation_storage(file_path).read(file_path, columns)
+
+
+def read_annotations_in_chunks(file_path, chunk_size, columns: Optional[List[str]] = None,
+                               start=0) -> Iterator[pd.DataFrame]:
+    return get_annotation_storage(file_path).read_chunks(file_path, chunk_size, columns, start)
+
+
+def write_annotations(data_frame: pd.DataFrame, file_path):
+    get_annotation_storage(file_path).write(data_frame, file_path)
@@ -1,6 +1,11 @@
-from typing import List
+from __future__ import annotations
 
-import pandas as pd
+from typing import Iterator, List, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 SUPPORTED_CLASSES = ['not_correct', 'correct']
 
@@ -35,30 +40,36 @@ class Keypoints:
 
     ATTRIBUTE_NAMES = BOUNDING_BOX_ATTRIBUTE_NAMES + BODY_POINTS_ATTRIBUTE_NAMES
 
-    def __init__(self, data_frame: pd.DataFrame):
-        if any(data_frame.columns != self.ATTRIBUTE_NAMES):
-            raise ValueError('DataFrame columns doesn\'t matches Keypoint attributes')
+    JOINT_NAMES = [attribute_name[:-2] for attribute_name in BODY_POINTS_ATTRIBUTE_NAMES[::2]]
+    _JOINT_INDICES = {joint_name: index for index, joint_name in enumerate(JOINT_NAMES)}
 
-        if len(data_frame) != 1:
-            raise ValueError('DataFrame should have exactly one row')
+    def __init__(self, bounding_box: np.ndarray, points: np.ndarray):
+        if bounding_box.shape != (len(self.BOUNDING_BOX_ATTRIBUTE_NAMES),):
+            raise ValueError(f'Bounding box should be in shape ({len(self.BOUNDING_BOX_ATTRIBUTE_NAMES)},)')
 
-        self._data_frame = data_frame
+        if points.shape != (self.NUMBER_OF_JOINTS, 2):
+            raise ValueError(f'Keypoints should be in shape ({self.NUMBER_OF_JOINTS}, 2)')
+
+        self._bounding_box = bounding_box
+        self._points = points
 
     @classmethod
     def from_data_frame(cls, data_frame: pd.DataFrame):
-        return cls(data_frame)
+        if any(data_frame.columns != cls.ATTRIBUTE_NAMES):
+            raise ValueError('DataFrame columns doesn\'t matches Keypoint attributes')
+
+        if len(data_frame) != 1:
+            raise ValueError('DataFrame should have exactly one row')
+
+        return KeypointsBatch.from_data_frame(data_frame)[0]
 
     @classmethod
     def from_detection_result(cls, bounding_box, confidence, points):
         if points.shape != (cls.NUMBER_OF_JOINTS, 2):
             raise ValueError(f'Keypoints should be in shape ({cls.NUMBER_OF_JOINTS}, 2)')
 
-        keypoint_coords = list(points.reshape(2 * cls.NUMBER_OF_JOINTS))
-        bounding_box_coords = list(bounding_box)
-        data_frame_values = tuple(bounding_box_coords + [confidence] + keypoint_coords)
-
-        data_frame = pd.DataFrame.from_records([data_frame_values], columns=cls.ATTRIBUTE_NAMES)
-        return cls(data_frame)
+        bounding_box = np.array(list(bounding_box) + [confidence], dtype=np.float64)
+        return cls(bounding_box, np.ascontiguousarray(points))
 
     @classmethod
     def get_point_attribute_name(cls, coordinate='x'):
@@ -68,16 +79,21 @@ class Keypoints:
         return [attribute_name for attribute_name in cls.ATTRIBUTE_NAMES if attribute_name.endswith(coordinate)]
 
     def _get_keypoint_coords(self, keypoint_name):
-        return _get_first_row_value_from_data_frame(self._data_frame, f'{keypoint_name}_x'), \
-               _get_first_row_value_from_data_frame(self._data_frame, f'{keypoint_name}_y')
+        x, y = self._points[self._JOINT_INDICES[keypoint_name]]
+        return x, y
 
     @property
     def bounding_box(self):
-        return [
-            self._get_keypoint_coords('bounding_box_lu'),
-            self._get_keypoint_coords('bounding_box_rd'),
-            _get_first_row_value_from_data_frame(self._data_frame, 'confidence')
-        ]
+        lu_x, lu_y, rd_x, rd_y, confidence = self._bounding_box
+        return [(lu_x, lu_y), (rd_x, rd_y), confidence]
+
+    @property
+    def bounding_box_values(self) -> np.ndarray:
+        return self._bounding_box
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._points
 
     @property
     def nose(self):
@@ -147,8 +163,12 @@ class Keypoints:
     def l_feet(self):
         return self._get_keypoint_coords('l_feet')
 
+    def translate(self, offset_x, offset_y) -> Keypoints:
+        bounding_box = self._bounding_box + np.array([offset_x, offset_y, offset_x, offset_y, 0])
+        return Keypoints(bounding_box, self._points + np.array([offset_x, offset_y], dtype=self._points.dtype))
+
     def to_dataframe(self) -> pd.DataFrame:
-        return self._data_frame
+        return KeypointsBatch.from_keypoints_list([self]).to_dataframe()
 
     def to_keypoint_dict(self):
         return {
@@ -172,45 +192,194 @@ class Keypoints:
         }
 
 
+class KeypointsBatch:
+
+    def __init__(self, bounding_boxes: np.ndarray, points: np.ndarray):
+        if bounding_boxes.ndim != 2 or bounding_boxes.shape[1] != len(Keypoints.BOUNDING_BOX_ATTRIBUTE_NAMES):
+            raise ValueError(f'Bounding boxes should be in shape (N, {len(Keypoints.BOUNDING_BOX_ATTRIBUTE_NAMES)})')
+
+        if points.ndim != 3 or points.shape[1:] != (Keypoints.NUMBER_OF_JOINTS, 2):
+            raise ValueError(f'Keypoints should be in shape (N, {Keypoints.NUMBER_OF_JOINTS}, 2)')
+
+        if len(bounding_boxes) != len(points):
+            raise ValueError('Bounding boxes and keypoints should have the same number of rows')
+
+        self._bounding_boxes = np.ascontiguousarray(bounding_boxes, dtype=np.float64)
+        self._points = np.ascontiguousarray(points)
+
+    @classmethod
+    def from_keypoints_list(cls, keypoints_list: List[Keypoints]):
+        if len(keypoints_list) == 0:
+            return cls(np.empty((0, len(Keypoints.BOUNDING_BOX_ATTRIBUTE_NAMES))),
+                       np.empty((0, Keypoints.NUMBER_OF_JOINTS, 2)))
+
+        return cls(np.stack([keypoints.bounding_box_values for keypoints in keypoints_list]),
+                   np.stack([keypoints.points for keypoints in keypoints_list]))
+
+    @classmethod
+    def from_data_frame(cls, data_frame: pd.DataFrame):
+        bounding_boxes = _get_numeric_values_from_data_frame(data_frame, Keypoints.BOUNDING_BOX_ATTRIBUTE_NAMES)
+        points = _get_numeric_values_from_data_frame(data_frame, Keypoints.BODY_POINTS_ATTRIBUTE_NAMES)
+        return cls(bounding_boxes, points.reshape(-1, Keypoints.NUMBER_OF_JOINTS, 2))
+
+    @property
+    def bounding_boxes(self) -> np.ndarray:
+        return self._bounding_boxes
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._points
+
+    @property
+    def body_points(self) -> np.ndarray:
+        return self._points.reshape(len(self._points), len(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES))
+
+    def __len__(self):
+        return len(self._points)
+
+    def __getitem__(self, index) -> Keypoints:
+        return Keypoints(self._bounding_boxes[index], self._points[index])
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        import pandas as pd
+
+        columns = dict(zip(Keypoints.BOUNDING_BOX_ATTRIBUTE_NAMES, self._bounding_boxes.T))
+        columns.update(zip(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES, self.body_points.T))
+
+        return pd.DataFrame(columns, columns=Keypoints.ATTRIBUTE_NAMES)
+
+
 class ImageAnnotation:
     ATTRIBUTE_NAMES = ['file_path', 'original_size_h', 'original_size_w', 'class']
 
-    def __init__(self, data_frame: pd.DataFrame):
-        self._data_frame = data_frame.filter(items=self.ATTRIBUTE_NAMES)
-        self.keypoints = Keypoints.from_data_frame(data_frame.filter(items=Keypoints.ATTRIBUTE_NAMES))
+    def __init__(self, file_path, original_size, class_name, keypoints: Keypoints):
+        self._file_path = file_path
+        self._class_name = class_name
+        self.original_size = original_size
+        self.keypoints = keypoints
 
     @classmethod
     def from_data_frame(cls, data_frame: pd.DataFrame):
-        return cls(data_frame)
+        return AnnotationBatch.from_data_frame(data_frame)[0]
 
     @classmethod
     def from_parameters(cls, file_path, original_size, class_name, keypoints: Keypoints):
-        data_frame = pd.DataFrame.from_records([
-            (file_path, original_size[0], original_size[1], class_name)],
-            columns=cls.ATTRIBUTE_NAMES)
-        return cls(data_frame.join(keypoints.to_dataframe()))
+        return cls(file_path, original_size, class_name, keypoints)
 
     @property
     def file_path(self):
-        return _get_first_row_value_from_data_frame(self._data_frame, 'file_path')
+        return self._file_path
 
     @property
     def class_name(self):
-        return _get_first_row_value_from_data_frame(self._data_frame, 'class')
+        return self._class_name
 
     @class_name.setter
     def class_name(self, value):
         if value not in SUPPORTED_CLASSES:
             raise ValueError('{0} not in supported classes'.format(value))
-        self._data_frame['class'] = value
+        self._class_name = value
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return AnnotationBatch.from_annotations_list([self]).to_dataframe()
+
+
+class AnnotationBatch:
+    ATTRIBUTE_NAMES = ImageAnnotation.ATTRIBUTE_NAMES
+
+    def __init__(self, file_paths, original_sizes, class_names, keypoints: KeypointsBatch):
+        self._file_paths = np.asarray(file_paths, dtype=object)
+        self._original_sizes = np.asarray(original_sizes, dtype=np.int64).reshape(-1, 2)
+        self._class_names = np.asarray(class_names, dtype=object)
+        self.keypoints = keypoints
+
+        if not len(self._file_paths) == len(self._original_sizes) == len(self._class_names) == len(keypoints):
+            raise ValueError('All annotation columns should have the same number of rows')
+
+    @classmethod
+    def from_annotations_list(cls, annotations: List[ImageAnnotation]):
+        return cls([annotation.file_path for annotation in annotations],
+                   [annotation.original_size for annotation in annotations],
+                   [annotation.class_name for annotation in annotations],
+                   KeypointsBatch.from_keypoints_list([annotation.keypoints for annotation in annotations]))
+
+    @classmethod
+    def from_data_frame(cls, data_frame: pd.DataFrame):
+        return cls(data_frame['file_path'].to_numpy(dtype=object),
+                   _get_numeric_values_from_data_frame(data_frame, ['original_size_h', 'original_size_w']),
+                   data_frame['class'].to_numpy(dtype=object),
+                   KeypointsBatch.from_data_frame(data_frame))
+
+    @classmethod
+    def read_csv(cls, file_path):
+        import pandas as pd
+        return cls.from_data_frame(pd.read_csv(file_path))
+
+    @classmethod
+    def read(cls, file_path):
+        from annotation_storage import read_annotations
+        return cls.from_data_frame(read_annotations(file_path))
+
+    @classmethod
+    def read_chunks(cls, file_path, chunk_size=1000, start=0) -> Iterator[AnnotationBatch]:
+        from annotation_storage import read_annotations_in_chunks
+        for data_frame in read_annotations_in_chunks(file_path, chunk_size, start=start):
+            yield cls.from_data_frame(data_frame)
+
+    @property
+    def file_paths(self) -> np.ndarray:
+        return self._file_paths
+
+    @property
+    def original_sizes(self) -> np.ndarray:
+        return self._original_sizes
+
+    @property
+    def class_names(self) -> np.ndarray:
+        return self._class_names
+
+    def __len__(self):
+        return len(self._file_paths)
+
+    def __getitem__(self, index) -> ImageAnnotation:
+        return ImageAnnotation(self._file_paths[index], tuple(self._original_sizes[index]),
+                               self._class_names[index], self.keypoints[index])
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
 
     def to_dataframe(self) -> pd.DataFrame:
-        return self._data_frame.join(self.keypoints.to_dataframe())
+        import pandas as pd
+
+        data_frame = pd.DataFrame({
+            'file_path': self._file_paths,
+            'original_size_h': self._original_sizes[:, 0],
+            'original_size_w': self._original_sizes[:, 1],
+            'class': self._class_names
+        }, columns=self.ATTRIBUTE_NAMES)
+        return data_frame.join(self.keypoints.to_dataframe())
 
+    def to_csv(self, file_path):
+        self.to_dataframe().to_csv(file_path)
 
-def _get_first_row_value_from_data_frame(dataframe, column):
-    return dataframe[column].values[0]
+    def write(self, file_path):
+        from annotation_storage import write_annotations
+        write_annotations(self.to_dataframe(), file_path)
+
+
+def _get_numeric_values_from_data_frame(data_frame, columns) -> np.ndarray:
+    values = data_frame[columns].to_numpy()
+    return values.astype(np.float64) if values.dtype == object else values
 
 
 def data_frame_to_annotations_list(data_frame: pd.DataFrame) -> List[ImageAnnotation]:
-    return [ImageAnnotation.from_data_frame(row[1].to_frame().transpose()) for row in data_frame.iterrows()]
+    return list(AnnotationBatch.from_data_frame(data_frame))
+
+
+def iterate_annotations(file_path, start=0, chunk_size=1000) -> Iterator[ImageAnnotation]:
+    # Only one chunk of typed columns is kept in memory, annotations are views over its rows
+    for annotations_batch in AnnotationBatch.read_chunks(file_path, chunk_size, start):
+        yield from annotations_batch
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from annotations import Keypoints, ImageAnnotation, AnnotationBatch, SUPPORTED_CLASSES, \
+    data_frame_to_annotations_list
+from drawing.image_overlay import ImageOverlayPipeline, BoundingBoxImageOverlayStep, KeypointsImageOverlayStep, \
+    ClassNameImageOverlay
+from posture_detection.preprocessing import KEYPOINTS_PREPROCESSING_PIPELINE
+
+FRAME_SIZE = (480, 640)
+PREPROCESSING_ROW_COUNTS = [1, 100, 10000]
+PREDICT_BATCH_SIZES = [1, 10, 100, 1000, 10000]
+CLASS_NAME_TO_COLOR = {class_name: (0, 255, 0) for class_name in SUPPORTED_CLASSES}
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Times hot paths of posture detection stage by stage on synthetic data. "
+                                             "Doesn't need model weights, video files or network access")
+    ap.add_argument("-o", "--output_file_path", required=False, default=None,
+                    help="Path to json file with results")
+    ap.add_argument("-b", "--baseline_file_path", required=False, default=None,
+                    help="Path to json file with results of previous run, used to detect regressions")
+    ap.add_argument("-t", "--tolerance", required=False, type=float, default=0.25,
+                    help="Allowed relative slowdown compared to baseline before benchmark is reported as regression")
+    ap.add_argument("-f", "--filter", required=False, default=None,
+                    help="Runs only benchmarks which name contains given text")
+    ap.add_argument("-r", "--repeat", required=False, type=int, default=5,
+                    help="Number of measurements for each benchmark")
+    ap.add_argument("--min_time", required=False, type=float, default=0.05,
+                    help="Minimal duration of single measurement in seconds, short benchmarks are run in loop")
+    ap.add_argument("--seed", required=False, type=int, default=0,
+                    help="Seed of synthetic data generator")
+    return ap.parse_args()
+
+
+def generate_keypoints(random_state: np.random.RandomState, count) -> list:
+    keypoints = []
+    for _ in range(count):
+        lu = random_state.uniform(0, [FRAME_SIZE[1] / 2, FRAME_SIZE[0] / 2])
+        size = random_state.uniform(50, [FRAME_SIZE[1] / 2, FRAME_SIZE[0] / 2])
+        points = lu + random_state.uniform(0, 1, (Keypoints.NUMBER_OF_JOINTS, 2)) * size
+        keypoints.append(Keypoints.from_detection_result(np.concatenate([lu, lu + size]),
+                                                         random_state.uniform(0.3, 1.0), points))
+    return keypoints
+
+
+def generate_annotations(random_state: np.random.RandomState, count) -> list:
+    return [ImageAnnotation.from_parameters(f'images/{SUPPORTED_CLASSES[i % 2]}/{i:06d}.jpg', FRAME_SIZE,
+                                            SUPPORTED_CLASSES[i % 2], keypoints)
+            for i, keypoints in enumerate(generate_keypoints(random_state, count))]
+
+
+def generate_frame(random_state: np.random.RandomState) -> np.ndarray:
+    return random_state.randint(0, 256, FRAME_SIZE + (3,), dtype=np.uint8)
+
+
+def write_random_numpy_weights(random_state: np.random.RandomState, model_path):
+    from posture_detection.numpy_nn_model import NUMPY_WEIGHTS_FILE_NAME
+
+    # Same architecture as SimpleNNModel
+    input_size = len(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES)
+    np.savez(os.path.join(model_path, NUMPY_WEIGHTS_FILE_NAME),
+             activations=np.array(['sigmoid', 'sigmoid']),
+             kernel_0=random_state.normal(size=(input_size, 8)).astype(np.float32),
+             bias_0=np.zeros(8, dtype=np.float32),
+             kernel_1=random_state.normal(size=(8, 1)).astype(np.float32),
+             bias_1=np.zeros(1, dtype=np.float32))
+
+
+def create_benchmarks(random_state: np.random.RandomState, model_path):
+    keypoints = generate_keypoints(random_state, 1)[0]
+    annotation = generate_annotations(random_state, 1)[0]
+    points = keypoints.points
+
+    benchmarks = [
+        ('Keypoints.from_detection_result', 1,
+         lambda: Keypoints.from_detection_result(np.array([10.0, 20.0, 200.0, 400.0]), 0.9, points)),
+        ('ImageAnnotation.from_parameters', 1,
+         lambda: ImageAnnotation.from_parameters('image.jpg', FRAME_SIZE, SUPPORTED_CLASSES[0], keypoints)),
+        ('ImageAnnotation.to_dataframe', 1, annotation.to_dataframe)
+    ]
+
+    for row_count in PREPROCESSING_ROW_COUNTS:
+        data_frame = AnnotationBatch.from_annotations_list(generate_annotations(random_state, row_count)).to_dataframe()
+        benchmarks.append((f'PreProcessingPipeline.run[rows={row_count}]', row_count,
+                           lambda data_frame=data_frame: KEYPOINTS_PREPROCESSING_PIPELINE.run(data_frame)))
+
+    data_frame = AnnotationBatch.from_annotations_list(generate_annotations(random_state, 1000)).to_dataframe()
+    benchmarks.append(('data_frame_to_annotations_list[rows=1000]', 1000,
+                       lambda: data_frame_to_annotations_list(data_frame)))
+
+    frame = generate_frame(random_state)
+    overlay = ImageOverlayPipeline([
+        BoundingBoxImageOverlayStep(keypoints.bounding_box),
+        KeypointsImageOverlayStep(keypoints),
+        ClassNameImageOverlay(SUPPORTED_CLASSES[0], CLASS_NAME_TO_COLOR)
+    ])
+    benchmarks.append(('ImageOverlayPipeline.apply', 1, lambda: overlay.apply(frame.copy())))
+    low_detail_overlay = ImageOverlayPipeline([
+        BoundingBoxImageOverlayStep(keypoints.bounding_box),
+        KeypointsImageOverlayStep(keypoints, show_labels=False),
+        ClassNameImageOverlay(SUPPORTED_CLASSES[0], CLASS_NAME_TO_COLOR)
+    ])
+    benchmarks.append(('ImageOverlayPipeline.apply[low_detail]', 1, lambda: low_detail_overlay.apply(frame.copy())))
+
+    write_random_numpy_weights(random_state, model_path)
+    for model_name, create_model in [('NumpyNNModel', create_numpy_model), ('SimpleNNModel', create_keras_model)]:
+        for batch_size in PREDICT_BATCH_SIZES:
+            data_frame = AnnotationBatch.from_annotations_list(
+                generate_annotations(random_state, batch_size)).to_dataframe()
+            benchmarks.append((f'{model_name}.predict[batch={batch_size}]', batch_size,
+                               lambda create_model=create_model, data_frame=data_frame:
+                               create_model(model_path).predict(data_frame)))
+
+    return benchmarks
+
+
+_models = {}
+
+
+def create_numpy_model(model_path):
+    if 'numpy' not in _models:
+        from posture_detection.numpy_nn_model import NumpyNNModel
+        _models['numpy'] = NumpyNNModel(model_path)
+    return _models['numpy']
+
+
+def create_keras_model(model_path):
+    if 'keras' not in _models:
+        from posture_detection.simple_nn_model import SimpleNNModel
+        _models['keras'] = SimpleNNModel(model_path)
+    return _models['keras']
+
+
+def measure(function, repeat, min_time):
+    # First call is not measured, it includes lazy imports and model creation
+    function()
+
+    number = 1
+    while True:
+        start_time = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed_time = time.perf_counter() - start_time
+        if elapsed_time >= min_time:
+            break
+        number *= 10 if elapsed_time < min_time / 10 else 2
+
+    call_times = [elapsed_time / number]
+    for _ in range(repeat - 1):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            function()
+        call_times.append((time.perf_counter() - start_time) / number)
+
+    return call_times
+
+
+def run_benchmarks(benchmarks, repeat, min_time, name_filter=None):
+    results = []
+    for name, rows, function in benchmarks:
+        if name_filter is not None and name_filter not in name:
+            continue
+
+        try:
+            call_times = measure(function, repeat, min_time)
+        except Exception as e:
+            results.append({'name': name, 'error': f'{type(e).__name__}: {e}'})
+            continue
+
+        median_time = statistics.median(call_times)
+        results.append({
+            'name': name,
+            'rows': rows,
+            'median_time': median_time,
+            'min_time': min(call_times),
+            'rows_per_second': rows / median_time
+        })
+
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    baseline_results = {result['name']: result for result in baseline['results'] if 'error' not in result}
+
+    for result in results:
+        baseline_result = baseline_results.get(result['name'])
+        if 'error' in result or baseline_result is None:
+            continue
+
+        result['baseline_ratio'] = result['median_time'] / baseline_result['median_time']
+        result['regression'] = result['baseline_ratio'] > 1 + tolerance
+
+    return [result for result in results if result.get('regression')]
+
+
+def print_results(results):
+    for result in results:
+        if 'error' in result:
+            print(f'{result["name"]:<45} failed: {result["error"]}')
+            continue
+
+        comparison = ''
+        if 'baseline_ratio' in result:
+            comparison = f'  {result["baseline_ratio"]:>5.2f}x baseline' + \
+                         ('  REGRESSION' if result['regression'] else '')
+        print(f'{result["name"]:<45} {1e6 * result["median_time"]:>12.1f} us  '
+              f'{result["rows_per_second"]:>12.0f} rows/s{comparison}')
+
+
+def main(args):
+    random_state = np.random.RandomState(args.seed)
+
+    with tempfile.TemporaryDirectory() as model_path:
+        benchmarks = create_benchmarks(random_state, model_path)
+        results = run_benchmarks(benchmarks, args.repeat, args.min_time, args.filter)
+
+    regressions = []
+    if args.baseline_file_path is not None:
+        with open(args.baseline_file_path) as baseline_file:
+            regressions = compare_with_baseline(results, json.load(baseline_file), args.tolerance)
+
+    print_results(results)
+
+    if args.output_file_path is not None:
+        with open(args.output_file_path, 'w') as output_file:
+            json.dump({
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'seed': args.seed,
+                'results': results
+            }, output_file, indent=2)
+
+    return regressions
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    regressions = main(args)
+    if regressions:
+        print(f'{len(regressions)} benchmarks slower than baseline by more than {100 * args.tolerance:.0f}%')
+        sys.exit(1)
@@ -0,0 +1,80 @@
+import argparse
+import json
+import os.path as path
+import statistics
+import subprocess
+import sys
+
+SOURCES_DIRECTORY = path.dirname(path.dirname(path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    'data_preparation.display_annotations',
+    'data_preparation.extract_and_save_keypoints',
+    'data_preparation.extract_images_from_video',
+    'posture_detection.demo',
+    'posture_detection.export_model',
+    'posture_detection.inspect_model',
+    'posture_detection.train_model'
+]
+
+HEAVY_MODULES = ['pandas', 'tensorflow', 'torch', 'matplotlib', 'sklearn']
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+import_time = time.perf_counter() - start_time
+print(json.dumps({{'import_time': import_time, 'loaded_modules': [m for m in {heavy_modules} if m in sys.modules]}}))
+'''
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Measures cold import time of every entry point in fresh interpreter")
+    ap.add_argument("-r", "--repeat", required=False, type=int, default=5,
+                    help="Number of measurements for each entry point")
+    ap.add_argument("-o", "--output_file_path", required=False, default=None,
+                    help="Path to json file with results")
+    return ap.parse_args()
+
+
+def measure_import_time(module, repeat):
+    script = IMPORT_SCRIPT.format(module=module, heavy_modules=HEAVY_MODULES)
+    import_times = []
+    loaded_modules = []
+
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-c', script], cwd=SOURCES_DIRECTORY, capture_output=True,
+                                 text=True)
+        if process.returncode != 0:
+            return {'module': module, 'error': process.stderr.strip().splitlines()[-1]}
+
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        import_times.append(result['import_time'])
+        loaded_modules = result['loaded_modules']
+
+    return {
+        'module': module,
+        'median_import_time': statistics.median(import_times),
+        'min_import_time': min(import_times),
+        'loaded_heavy_modules': loaded_modules
+    }
+
+
+def main(args):
+    results = [measure_import_time(module, args.repeat) for module in ENTRY_POINTS]
+
+    for result in results:
+        if 'error' in result:
+            print(f'{result["module"]:<50} failed: {result["error"]}')
+        else:
+            print(f'{result["module"]:<50} {1000 * result["median_import_time"]:>9.1f} ms  '
+                  f'heavy modules: {", ".join(result["loaded_heavy_modules"]) or "-"}')
+
+    if args.output_file_path is not None:
+        with open(args.output_file_path, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
@@ -0,0 +1,66 @@
+import argparse
+import os.path as path
+
+import cv2
+import numpy as np
+
+from keypoints_detection.factory import create_keypoint_detector
+from keypoints_detection.tracking_detector import TrackingKeypointDetector
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Compares keypoints tracked between detector runs with full detection "
+                                             "on every frame of video and reports detector call savings and drift")
+    ap.add_argument("-i", "--video_file_path", required=True,
+                    help="Path to input video file")
+    ap.add_argument("-k", "--keypoint_detector_model_path", required=True,
+                    help="Path to keypoint detection model")
+    ap.add_argument("-t", "--tracking_interval", required=False, type=int, default=5,
+                    help="Number of frames between keypoint detector runs")
+    ap.add_argument("-n", "--max_frames", required=False, type=int, default=None,
+                    help="Maximum number of processed frames")
+    return ap.parse_args()
+
+
+def measure_drift(video_file_path, keypoint_detector, tracking_detector: TrackingKeypointDetector, max_frames=None):
+    cap = cv2.VideoCapture(video_file_path)
+    drifts = []
+    frame_num = 0
+
+    while max_frames is None or frame_num < max_frames:
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            break
+
+        frame_num += 1
+        detected_keypoints = keypoint_detector.detect(frame)
+        tracked_keypoints = tracking_detector.detect(frame)
+
+        # Drift is measured for first person, as it is the one used by posture detection
+        if len(detected_keypoints) > 0 and len(tracked_keypoints) > 0:
+            distances = np.linalg.norm(detected_keypoints[0].points - tracked_keypoints[0].points, axis=1)
+            drifts.append(distances.mean())
+
+    cap.release()
+    return np.array(drifts)
+
+
+def main(args):
+    if not path.exists(args.video_file_path):
+        print("File {0} doesn't exist".format(args.video_file_path))
+        return
+
+    keypoint_detector = create_keypoint_detector(args.keypoint_detector_model_path)
+    tracking_detector = TrackingKeypointDetector(keypoint_detector, detection_interval=args.tracking_interval)
+    drifts = measure_drift(args.video_file_path, keypoint_detector, tracking_detector, args.max_frames)
+
+    print(f'Detector calls: {tracking_detector.detector_calls}, tracked frames: {tracking_detector.tracked_frames}, '
+          f'saved calls: {100 * tracking_detector.detector_call_savings:.1f}%')
+    if len(drifts) > 0:
+        print(f'Mean joint drift: {drifts.mean():.2f} px, p95: {np.percentile(drifts, 95):.2f} px, '
+              f'max: {drifts.max():.2f} px')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
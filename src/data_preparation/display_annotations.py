@@ -1,11 +1,13 @@
 import argparse
 import os.path as path
+import queue
+import threading
+from typing import Iterator
 
 import cv2
-import pandas as pd
 from numpy.core.multiarray import ndarray
 
-from annotations import ImageAnnotation, data_frame_to_annotations_list
+from annotations import ImageAnnotation, iterate_annotations
 from drawing.image_overlay import ImageOverlayPipeline, TextImageOverlayStep, BoundingBoxImageOverlayStep, \
     KeypointsImageOverlayStep
 
@@ -13,47 +15,136 @@ BOUNDING_BOX_COLOR = (0, 255, 255)
 KEYPOINT_COLOR = (0, 255, 0)
 TEXT_COLOR = (255, 0, 0)
 
+QUIT_KEYS = [ord('q'), 27]
+SKIP_FORWARD_KEY = ord('f')
+SKIP_BACKWARD_KEY = ord('b')
+END_OF_ANNOTATIONS = None
+
 
 def parse_args():
     ap = argparse.ArgumentParser(description="Displays keypoints saved in annotations file")
     ap.add_argument("-i", "--annotations_file_path", required=True,
-                    help="Path to annotations in csv format")
+                    help="Path to annotations file (.csv, .npann or .parquet)")
+    ap.add_argument("-s", "--start_index", required=False, type=int, default=0,
+                    help="Index of first displayed annotation, earlier rows are skipped without loading them")
+    ap.add_argument("-j", "--skip_count", required=False, type=int, default=100,
+                    help="Number of annotations skipped with 'f' (forward) and 'b' (backward) keys")
+    ap.add_argument("-p", "--prefetch_count", required=False, type=int, default=8,
+                    help="Number of images decoded in background ahead of displayed one")
+    ap.add_argument("--chunk_size", required=False, type=int, default=1000,
+                    help="Number of annotations read from file at once")
     return ap.parse_args()
 
 
-def put_annotations_on_image(image: ndarray, image_annotations: ImageAnnotation):
-    keypoints = image_annotations.keypoints
-    image_overlay = ImageOverlayPipeline([
-        TextImageOverlayStep([image_annotations.file_path, image_annotations.class_name], text_color=TEXT_COLOR),
-        BoundingBoxImageOverlayStep(keypoints.bounding_box, color=BOUNDING_BOX_COLOR),
-        KeypointsImageOverlayStep(keypoints, keypoint_color=KEYPOINT_COLOR, text_color=TEXT_COLOR)
-    ])
-
-    image_overlay.apply(image)
-
-
-def display_annotations(image_annotations: ImageAnnotation):
-    image = cv2.imread(image_annotations.file_path)
-    put_annotations_on_image(image, image_annotations)
+class ImagePrefetcher(threading.Thread):
+
+    def __init__(self, annotations: Iterator[ImageAnnotation], prefetch_count=8):
+        super().__init__(name='prefetch', daemon=True)
+        self._annotations = annotations
+        self._output_queue = queue.Queue(maxsize=prefetch_count)
+        self._stop_event = threading.Event()
+        self.exception = None
+
+    def __iter__(self):
+        while True:
+            item = self._output_queue.get()
+            if item is END_OF_ANNOTATIONS:
+                break
+            yield item
+
+        if self.exception is not None:
+            raise self.exception
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        # End of annotations is always put, so consumer doesn't wait forever when reading fails
+        try:
+            for annotation in self._annotations:
+                image = cv2.imread(annotation.file_path) if path.exists(annotation.file_path) else None
+                if not self._put((annotation, image)):
+                    return
+        except Exception as e:
+            self.exception = e
+        finally:
+            self._put(END_OF_ANNOTATIONS)
+
+    def _put(self, item):
+        # Blocks while queue is full, but still notices stop, so skipping doesn't wait for pending images
+        while not self._stop_event.is_set():
+            try:
+                self._output_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+# Overlay steps are created once per review and reused between images, only their data is updated
+class AnnotationsOverlay:
+
+    def __init__(self):
+        self._text_overlay = TextImageOverlayStep([], text_color=TEXT_COLOR)
+        self._bounding_box_overlay = BoundingBoxImageOverlayStep(None, color=BOUNDING_BOX_COLOR)
+        self._keypoints_overlay = KeypointsImageOverlayStep(None, keypoint_color=KEYPOINT_COLOR,
+                                                            text_color=TEXT_COLOR)
+        self._pipeline = ImageOverlayPipeline([self._text_overlay, self._bounding_box_overlay,
+                                               self._keypoints_overlay])
+
+    def apply(self, image: ndarray, image_annotations: ImageAnnotation):
+        keypoints = image_annotations.keypoints
+        self._text_overlay.update([image_annotations.file_path, image_annotations.class_name])
+        self._bounding_box_overlay.update(keypoints.bounding_box)
+        self._keypoints_overlay.update(keypoints)
+        return self._pipeline.apply(image)
+
+
+def display_annotations(image: ndarray, image_annotations: ImageAnnotation, overlay: AnnotationsOverlay):
+    overlay.apply(image, image_annotations)
     cv2.imshow('annotations', image)
-    cv2.waitKey()
+    return cv2.waitKey() & 0xFF
+
+
+def review_annotations(annotations_file_path, start_index=0, skip_count=100, prefetch_count=8, chunk_size=1000):
+    overlay = AnnotationsOverlay()
+    index = start_index
+    while True:
+        prefetcher = ImagePrefetcher(iterate_annotations(annotations_file_path, index, chunk_size), prefetch_count)
+        prefetcher.start()
+        next_index = None
+
+        for annotation, image in prefetcher:
+            if image is None:
+                print("File {0} doesn't exist".format(annotation.file_path))
+                index += 1
+                continue
+
+            key = display_annotations(image, annotation, overlay)
+            if key in QUIT_KEYS:
+                break
+            if key == SKIP_FORWARD_KEY:
+                next_index = index + skip_count
+                break
+            if key == SKIP_BACKWARD_KEY:
+                next_index = max(index - skip_count, 0)
+                break
+            index += 1
+
+        # Seeking restarts reading at new index, rows in between are neither read nor decoded
+        prefetcher.stop()
+        if next_index is None:
+            return
+        index = next_index
 
 
 def main(args):
     if not path.exists(args.annotations_file_path):
-        print("File () doesn't exist".format(args.video_file_path))
+        print("File {0} doesn't exist".format(args.annotations_file_path))
         return
 
-    annotations_data_frame = pd.read_csv(args.annotations_file_path)
-    annotations_list = data_frame_to_annotations_list(annotations_data_frame)
-
-    for annotation in annotations_list:
-
-        if not path.exists(annotation.file_path):
-            print("File () doesn't exist".format(args.video_file_path))
-            continue
-
-        display_annotations(annotation)
+    review_annotations(args.annotations_file_path, args.start_index, args.skip_count, args.prefetch_count,
+                       args.chunk_size)
 
 
 if __name__ == '__main__':
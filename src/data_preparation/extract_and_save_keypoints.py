@@ -1,16 +1,25 @@
 import argparse
+import multiprocessing
 import os
 import os.path as path
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import cv2
 import progressbar
 
-from annotations import ImageAnnotation, SUPPORTED_CLASSES
+from annotation_storage import write_annotations
+from annotations import ImageAnnotation, AnnotationBatch, SUPPORTED_CLASSES
+from data_preparation.keypoints_cache import KeypointsCache, get_model_identity
 from keypoints_detection.KeypointDetector import KeypointDetector
+from keypoints_detection.caching_detector import CachingKeypointDetector
 from keypoints_detection.factory import create_keypoint_detector
+from keypoints_detection.person_selection import select_persons, PERSON_SELECTION_POLICIES
 
 allowed_extensions = ['.jpg']
 
+CHUNK_SIZE_IN_BATCHES = 4
+
 
 class InvalidDirectoryStructureError(Exception):
     pass
@@ -18,13 +27,32 @@ class InvalidDirectoryStructureError(Exception):
 
 def parse_args():
     ap = argparse.ArgumentParser(description='Processes images placed in images_directory with keypoint detector and '
-                                             'creates annotation file for whole dataset in csv format. Images in '
+                                             'creates annotation file for whole dataset. Images in '
                                              'images_directory must be organized in subfolders named by image '
                                              'class names')
     ap.add_argument("-i", "--images_directory", required=True,
                     help="Path to directory with images")
     ap.add_argument("-m", "--model_path", required=True,
                     help="Path to directory with images")
+    ap.add_argument("-b", "--batch_size", required=False, type=int, default=8,
+                    help="Number of images passed to keypoint detector at once")
+    ap.add_argument("-w", "--workers", required=False, type=int, default=1,
+                    help="Number of worker processes, each one with its own keypoint detector")
+    ap.add_argument("-c", "--cache_file_path", required=False, default=None,
+                    help="Path to keypoints cache file, defaults to keypoints_cache.jsonl in images_directory. "
+                         "Only images which are not in cache or were modified are processed by detector")
+    ap.add_argument("--no_cache", action='store_true',
+                    help="Processes all images without reading or writing keypoints cache")
+    ap.add_argument("-d", "--detection_cache_directory", required=False, default=None,
+                    help="Directory of detection cache shared between datasets and runs. Detections are stored "
+                         "under hash of image content, so copied or moved images are not detected again")
+    ap.add_argument("-s", "--person_selection", required=False, default='all',
+                    choices=list(PERSON_SELECTION_POLICIES.keys()),
+                    help="Which detected persons are annotated. Use 'largest' or 'most_confident' for datasets with "
+                         "single subject per image")
+    ap.add_argument("-o", "--output_file_name", required=False, default='annotations.csv',
+                    help="Name of annotations file created in images_directory. Format is selected by extension: "
+                         ".csv, .npann (memory mapped NumPy arrays) or .parquet")
     return ap.parse_args()
 
 
@@ -51,43 +79,130 @@ def get_images_to_process(directory_path):
     return image_path_to_class_mapping
 
 
-def process_images(images_directory, keypoint_detector: KeypointDetector):
-    annotations_df = pd.DataFrame()
-    images_to_class_mapping = get_images_to_process(images_directory)
-    progress_bar = progressbar.ProgressBar(max_value=len(images_to_class_mapping))
+def process_images(images_directory, keypoint_detector: KeypointDetector, batch_size=1,
+                   cache: KeypointsCache = None, person_selection='all'):
+    images_to_process = list(get_images_to_process(images_directory).items())
+    chunks = split_to_chunks(get_images_to_detect(images_to_process, cache), batch_size * CHUNK_SIZE_IN_BATCHES)
+    chunks_detections = (detect_images_chunk(chunk, keypoint_detector, batch_size) for chunk in chunks)
+
+    return collect_annotations(images_to_process, chunks, chunks_detections, cache, person_selection)
+
+
+def process_images_parallel(images_directory, model_path, workers, batch_size=1, cache: KeypointsCache = None,
+                            person_selection='all', detection_cache_directory=None):
+    images_to_process = list(get_images_to_process(images_directory).items())
+    chunks = split_to_chunks(get_images_to_detect(images_to_process, cache), batch_size * CHUNK_SIZE_IN_BATCHES)
+
+    # Spawned workers don't inherit CUDA state from parent process
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=_init_worker,
+                      initargs=(model_path, batch_size, detection_cache_directory)) as pool:
+        chunks_detections = pool.imap(_detect_images_chunk_in_worker, chunks)
+        return collect_annotations(images_to_process, chunks, chunks_detections, cache, person_selection)
+
+
+def get_images_to_detect(images_to_process, cache: KeypointsCache = None):
+    if cache is None:
+        return images_to_process
+
+    return [(image_path, class_name) for image_path, class_name in images_to_process
+            if cache.get(image_path) is None]
+
+
+def collect_annotations(images_to_process, chunks, chunks_detections, cache: KeypointsCache = None,
+                        person_selection='all'):
+    progress_bar = progressbar.ProgressBar(max_value=len(images_to_process))
+    progress_bar.update(len(images_to_process) - sum(len(chunk) for chunk in chunks))
+
+    # Cache is saved after every chunk so interrupted run can be resumed
+    detections = {}
+    for chunk, chunk_detections in zip(chunks, chunks_detections):
+        for image_path, image_size, keypoints in chunk_detections:
+            detections[image_path] = image_size, keypoints
+            if cache is not None:
+                cache.put(image_path, image_size, keypoints)
+        if cache is not None:
+            cache.flush()
+        progress_bar.update(progress_bar.value + len(chunk))
+
+    annotations = []
+    for image_path, class_name in images_to_process:
+        # Only images which were not detected in this run are looked up in cache
+        image_detections = detections.get(image_path)
+        if image_detections is None and cache is not None:
+            image_detections = cache.get(image_path)
+        if image_detections is None:
+            continue
+
+        # Every selected person is saved as separate annotation of the image
+        image_size, keypoints = image_detections
+        for person_keypoints in select_persons(keypoints, person_selection):
+            annotations.append(get_image_annotation(image_path, class_name, image_size, person_keypoints))
+
+    return annotations_to_data_frame(annotations)
 
-    for i, image_info in enumerate(images_to_class_mapping.items()):
-        image_path, class_name = image_info
-        keypoints = process_image(image_path, keypoint_detector)
-        annotations_df = annotations_df.append(
-            get_image_annotation(image_path, class_name, keypoints), ignore_index=True)
-        progress_bar.update(i)
 
-    return annotations_df
+def detect_images_chunk(images_to_process, keypoint_detector: KeypointDetector, batch_size=1):
+    batches = split_to_chunks(images_to_process, batch_size)
+    detections = []
 
+    # Next batch of images is decoded in background while detector processes current one
+    with ThreadPoolExecutor(max_workers=1) as prefetch_executor:
+        next_images = prefetch_executor.submit(read_images, batches[0]) if batches else None
 
-def process_image(image_path, keypoint_detector: KeypointDetector):
-    keypoints = keypoint_detector.detect(image_path)
+        for i, batch in enumerate(batches):
+            images = next_images.result()
+            if i + 1 < len(batches):
+                next_images = prefetch_executor.submit(read_images, batches[i + 1])
 
-    if len(keypoints) == 0:
-        return None
+            batch = [(image_path, image) for (image_path, _), image in zip(batch, images) if image is not None]
+            batch_keypoints = keypoint_detector.detect_batch([image for _, image in batch])
 
-    # We process only first detection
-    # TODO: Select detection by size or something else
-    keypoints = keypoints[0]
+            for (image_path, image), keypoints in zip(batch, batch_keypoints):
+                detections.append((image_path, image.shape[:2], keypoints))
 
-    return keypoints
+    return detections
 
 
-def get_image_annotation(image_path, class_name, keypoints):
-    if keypoints is None:
-        return pd.DataFrame()
+def read_images(images_to_process):
+    images = []
+    for image_path, _ in images_to_process:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f'Unable to read image {image_path}')
+        images.append(image)
 
-    img = cv2.imread(image_path)
-    height, width, channels = img.shape
+    return images
 
-    annotation = ImageAnnotation.from_parameters(image_path, (height, width), class_name, keypoints)
-    return annotation.to_dataframe()
+
+def split_to_chunks(items, chunk_size):
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+_worker_keypoint_detector = None
+_worker_batch_size = 1
+
+
+def _init_worker(model_path, batch_size, detection_cache_directory=None):
+    global _worker_keypoint_detector, _worker_batch_size
+    _worker_keypoint_detector = create_keypoint_detector(model_path, cache_directory=detection_cache_directory)
+    _worker_batch_size = batch_size
+
+
+def _detect_images_chunk_in_worker(images_to_process):
+    return detect_images_chunk(images_to_process, _worker_keypoint_detector, _worker_batch_size)
+
+
+def process_image(image_path, keypoint_detector: KeypointDetector, person_selection='all'):
+    return select_persons(keypoint_detector.detect(image_path), person_selection)
+
+
+def get_image_annotation(image_path, class_name, image_size, keypoints):
+    return ImageAnnotation.from_parameters(image_path, image_size, class_name, keypoints)
+
+
+def annotations_to_data_frame(annotations) -> pd.DataFrame:
+    return AnnotationBatch.from_annotations_list(annotations).to_dataframe()
 
 
 def list_directories(directory_path):
@@ -104,11 +219,26 @@ def main(args):
         print("Directory () doesn't exist".format(args.images_directory))
         return
 
-    keypoint_detector = create_keypoint_detector(args.model_path)
-    annotations_df = process_images(args.images_directory, keypoint_detector)
-
-    output_path = os.path.join(args.images_directory, 'annotations.csv')
-    annotations_df.to_csv(output_path)
+    cache = None
+    if not args.no_cache:
+        cache_file_path = args.cache_file_path or os.path.join(args.images_directory, 'keypoints_cache.jsonl')
+        cache = KeypointsCache(get_model_identity(args.model_path), cache_file_path)
+
+    if args.workers > 1:
+        annotations_df = process_images_parallel(args.images_directory, args.model_path, args.workers,
+                                                 args.batch_size, cache, args.person_selection,
+                                                 args.detection_cache_directory)
+    else:
+        keypoint_detector = create_keypoint_detector(args.model_path, cache_directory=args.detection_cache_directory)
+        annotations_df = process_images(args.images_directory, keypoint_detector, args.batch_size, cache,
+                                        args.person_selection)
+
+        if isinstance(keypoint_detector, CachingKeypointDetector):
+            print(f'Detection cache hit rate: {100 * keypoint_detector.hit_rate:.1f}% '
+                  f'({keypoint_detector.hits} hits, {keypoint_detector.misses} misses)')
+
+    output_path = os.path.join(args.images_directory, args.output_file_name)
+    write_annotations(annotations_df, output_path)
 
 
 if __name__ == '__main__':
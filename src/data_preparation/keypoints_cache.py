@@ -0,0 +1,93 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from annotations import Keypoints
+from keypoints_detection.caching_detector import get_model_identity
+
+# Cache file is rewritten when it has more overwritten or broken lines than this and than up to date entries
+COMPACTION_MIN_STALE_LINES = 1000
+
+
+class KeypointsCache:
+
+    def __init__(self, model_identity, cache_file_path=None):
+        self._model_identity = model_identity
+        self._cache_file_path = cache_file_path
+        self._entries = {}
+        self._pending_lines = []
+
+        if cache_file_path is not None and os.path.exists(cache_file_path):
+            self._load()
+
+    def get(self, image_path) -> Optional[Tuple[Tuple[int, int], List[Keypoints]]]:
+        entry = self._entries.get(image_path)
+        if entry is None or entry['image_stat'] != _get_image_stat(image_path):
+            return None
+
+        keypoints = [Keypoints.from_detection_result(np.array(bounding_box[:4]), bounding_box[4],
+                                                     np.array(points).reshape(Keypoints.NUMBER_OF_JOINTS, 2))
+                     for bounding_box, points in entry['keypoints']]
+        return tuple(entry['image_size']), keypoints
+
+    def put(self, image_path, image_size, keypoints: List[Keypoints]):
+        entry = {
+            'image_path': image_path,
+            'image_stat': _get_image_stat(image_path),
+            'model_identity': self._model_identity,
+            'image_size': [int(size) for size in image_size],
+            'keypoints': [(k.bounding_box_values.tolist(), k.points.reshape(-1).tolist()) for k in keypoints]
+        }
+
+        self._entries[image_path] = entry
+        self._pending_lines.append(json.dumps(entry))
+
+    def flush(self):
+        if self._cache_file_path is None or len(self._pending_lines) == 0:
+            self._pending_lines = []
+            return
+
+        with open(self._cache_file_path, 'a') as cache_file:
+            cache_file.write(''.join(line + '\n' for line in self._pending_lines))
+            cache_file.flush()
+            os.fsync(cache_file.fileno())
+
+        self._pending_lines = []
+
+    def _load(self):
+        # File is append only, so only the last line of every image and model is up to date
+        latest_lines = {}
+        line_count = 0
+        with open(self._cache_file_path) as cache_file:
+            for line in cache_file:
+                line_count += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line may be incomplete if previous run was interrupted while writing
+                    continue
+
+                latest_lines[(entry['model_identity'], entry['image_path'])] = line
+                if entry['model_identity'] == self._model_identity:
+                    self._entries[entry['image_path']] = entry
+
+        stale_line_count = line_count - len(latest_lines)
+        if stale_line_count > max(COMPACTION_MIN_STALE_LINES, len(latest_lines)):
+            self._compact(latest_lines.values())
+
+    def _compact(self, lines):
+        # Entries of other models are kept, file is replaced atomically so interrupted compaction loses nothing
+        temporary_file_path = self._cache_file_path + '.tmp'
+        with open(temporary_file_path, 'w') as cache_file:
+            cache_file.write(''.join(line if line.endswith('\n') else line + '\n' for line in lines))
+            cache_file.flush()
+            os.fsync(cache_file.fileno())
+
+        os.replace(temporary_file_path, self._cache_file_path)
+
+
+def _get_image_stat(image_path):
+    image_stat = os.stat(image_path)
+    return [image_stat.st_size, image_stat.st_mtime_ns]
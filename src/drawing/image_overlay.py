@@ -1,16 +1,23 @@
 from abc import abstractmethod
-from typing import List
+from typing import List, Union
 
 import cv2
 import numpy as np
 
-from annotations import Keypoints
+from annotations import Keypoints, KeypointsBatch
 
 DEFAULT_BOUNDING_BOX_COLOR = (0, 255, 255)
 DEFAULT_KEYPOINT_COLOR = (0, 255, 0)
 DEFAULT_TEXT_COLOR = (255, 0, 0)
 
 
+def draw_points(image: np.ndarray, points: np.ndarray, color, radius=3):
+    # Every point is zero length segment of polyline, so all points are drawn by single OpenCV call. Pixels are the
+    # same as of filled cv2.circle with given radius
+    segments = np.repeat(np.asarray(points).reshape(-1, 1, 2).astype(np.int32), 2, axis=1)
+    cv2.polylines(image, segments, False, color, 2 * radius)
+
+
 class ImageOverlayStep:
 
     @abstractmethod
@@ -24,47 +31,76 @@ class BoundingBoxImageOverlayStep(ImageOverlayStep):
         self.color = color
         self.bounding_box = bounding_box
 
+    def update(self, bounding_box):
+        self.bounding_box = bounding_box
+        return self
+
     def put_overlay_on_image(self, image: np.ndarray):
-        cv2.rectangle(image, self.bounding_box[0], self.bounding_box[1], self.color)
+        if self.bounding_box is None:
+            return
+
+        if isinstance(self.bounding_box, KeypointsBatch):
+            bounding_boxes = self.bounding_box.bounding_boxes
+        else:
+            (lu_x, lu_y), (rd_x, rd_y), confidence = self.bounding_box
+            bounding_boxes = [(lu_x, lu_y, rd_x, rd_y, confidence)]
+
+        for lu_x, lu_y, rd_x, rd_y, _ in bounding_boxes:
+            cv2.rectangle(image, (int(lu_x), int(lu_y)), (int(rd_x), int(rd_y)), self.color)
 
 
 class KeypointsImageOverlayStep(ImageOverlayStep):
     TEXT_TO_POINT_OFFSET = (0, 10)
 
-    def __init__(self, keypoints: Keypoints, keypoint_color=DEFAULT_KEYPOINT_COLOR,
-                 text_color=DEFAULT_BOUNDING_BOX_COLOR):
+    def __init__(self, keypoints: Union[Keypoints, KeypointsBatch], keypoint_color=DEFAULT_KEYPOINT_COLOR,
+                 text_color=DEFAULT_BOUNDING_BOX_COLOR, show_labels=True):
         self.keypoint_color = keypoint_color
         self.text_color = text_color
         self.keypoints = keypoints
+        self.show_labels = show_labels
+
+    def update(self, keypoints: Union[Keypoints, KeypointsBatch]):
+        self.keypoints = keypoints
+        return self
 
-    def _put_keypoint(self, image, localisation, name):
+    def _put_label(self, image, localisation, name):
         text_localisation = tuple([localisation[0] + self.TEXT_TO_POINT_OFFSET[0],
                                    localisation[1] + self.TEXT_TO_POINT_OFFSET[1]])
-
-        cv2.circle(image, localisation, 3, self.keypoint_color, -1)
-        cv2.putText(image, name, text_localisation, cv2.FONT_HERSHEY_SIMPLEX, 1, self.text_color, 2,
-                    cv2.LINE_AA)
+        cv2.putText(image, name, text_localisation, cv2.FONT_HERSHEY_SIMPLEX, 1, self.text_color, 2, cv2.LINE_AA)
 
     def put_overlay_on_image(self, image: np.ndarray):
-        for joint_name, localisation in self.keypoints.to_keypoint_dict().items():
-            self._put_keypoint(image, localisation, joint_name)
+        if self.keypoints is None:
+            return
+
+        points = self.keypoints.points.reshape(-1, Keypoints.NUMBER_OF_JOINTS, 2)
+        draw_points(image, points, self.keypoint_color)
+
+        if not self.show_labels:
+            return
+
+        for person_points in points:
+            for joint_name, (x, y) in zip(Keypoints.JOINT_NAMES, person_points):
+                self._put_label(image, (int(x), int(y)), joint_name)
 
 
 class ClassNameImageOverlay(ImageOverlayStep):
     TEXT_LOCALIZATION = (35, 45)
 
-    def __init__(self, class_name, class_name_to_color_mapping):
-        self.class_name = class_name
+    def __init__(self, class_name, class_name_to_color_mapping, localization=TEXT_LOCALIZATION):
         self.class_name_to_color_mapping = class_name_to_color_mapping
+        self.update(class_name, localization)
 
-        if self.class_name not in self.class_name_to_color_mapping:
-            raise ValueError(f'class name {self.class_name} not defined in class_name_to_color_mapping')
+    def update(self, class_name, localization=TEXT_LOCALIZATION):
+        if class_name not in self.class_name_to_color_mapping:
+            raise ValueError(f'class name {class_name} not defined in class_name_to_color_mapping')
+
+        self.class_name = class_name
+        self.localization = localization
+        return self
 
     def put_overlay_on_image(self, image: np.ndarray):
         color = self.class_name_to_color_mapping[self.class_name]
-        text = self.class_name.upper()
-
-        cv2.putText(image, text, self.TEXT_LOCALIZATION, cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2,
+        cv2.putText(image, self.class_name.upper(), self.localization, cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2,
                     cv2.LINE_AA)
 
 
@@ -76,6 +112,10 @@ class TextImageOverlayStep(ImageOverlayStep):
         self.text_lines = text_lines
         self.text_color = text_color
 
+    def update(self, text_lines):
+        self.text_lines = text_lines
+        return self
+
     def put_overlay_on_image(self, image: np.ndarray):
         text_localisation = self.TEXT_LOCALIZATION
 
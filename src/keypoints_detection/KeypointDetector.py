@@ -9,3 +9,6 @@ class KeypointDetector:
     @abstractmethod
     def detect(self, image_path) -> List[Keypoints]:
         pass
+
+    def detect_batch(self, images) -> List[List[Keypoints]]:
+        return [self.detect(image) for image in images]
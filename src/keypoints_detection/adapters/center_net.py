@@ -1,7 +1,9 @@
 import os
 from typing import List
 
+import cv2
 import numpy as np
+import torch
 
 from CenterNet.src.lib.detectors.detector_factory import detector_factory
 from CenterNet.src.lib.opts import opts
@@ -24,7 +26,31 @@ class CenterNetKeypointDetectorAdapter(KeypointDetector):
 
     def detect(self, image_path) -> List[Keypoints]:
         ret = self.detector.run(image_path)
-        multipose_detections = ret['results'][1]
+        return self._map_results_to_keypoints(ret['results'])
+
+    def detect_batch(self, images) -> List[List[Keypoints]]:
+        # Flip test and multi scale testing merge outputs across the batch dimension inside CenterNet
+        # and keep_res produces inputs of different sizes, so only the fixed resolution setup can be batched
+        if self.opt.flip_test or self.opt.keep_res or len(self.opt.test_scales) != 1 or len(images) <= 1:
+            return super().detect_batch(images)
+
+        scale = self.opt.test_scales[0]
+        images = [cv2.imread(image) if isinstance(image, str) else image for image in images]
+        pre_processed_images = [self.detector.pre_process(image, scale) for image in images]
+
+        images_tensor = torch.cat([image_tensor for image_tensor, _ in pre_processed_images])
+        _, detections = self.detector.process(images_tensor.to(self.opt.device))
+
+        keypoints = []
+        for i, (_, meta) in enumerate(pre_processed_images):
+            image_detections = self.detector.post_process(detections[i:i + 1], meta, scale)
+            results = self.detector.merge_outputs([image_detections])
+            keypoints.append(self._map_results_to_keypoints(results))
+
+        return keypoints
+
+    def _map_results_to_keypoints(self, results) -> List[Keypoints]:
+        multipose_detections = results[1]
 
         return [self.map_result_to_keypoints(multipose_detection) for multipose_detection in multipose_detections
                 if multipose_detection[4] > self.opt.vis_thresh]
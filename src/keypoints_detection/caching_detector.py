@@ -0,0 +1,140 @@
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+from annotations import Keypoints
+from keypoints_detection.KeypointDetector import KeypointDetector
+
+CACHE_ENTRY_EXTENSION = '.npz'
+DEFAULT_MAX_CACHE_SIZE = 1024 ** 3
+
+
+def get_model_identity(model_path, **options):
+    model_stat = os.stat(model_path)
+    model_description = f'{os.path.abspath(model_path)}:{model_stat.st_size}:{model_stat.st_mtime_ns}'
+    for name, value in sorted(options.items()):
+        model_description += f':{name}={value}'
+    return hashlib.sha1(model_description.encode('utf-8')).hexdigest()
+
+
+# Detections are stored on disk under hash of image content and model identity, so the same image is detected once
+# even if it is moved or copied. Least recently used entries are evicted when cache exceeds max_size bytes.
+class CachingKeypointDetector(KeypointDetector):
+
+    def __init__(self, keypoint_detector: KeypointDetector, cache_directory, model_identity,
+                 max_size=DEFAULT_MAX_CACHE_SIZE):
+        self._keypoint_detector = keypoint_detector
+        self._cache_directory = cache_directory
+        self._model_identity = model_identity
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_directory, exist_ok=True)
+        self._load_index()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    @property
+    def size(self):
+        return self._size
+
+    def detect(self, image) -> List[Keypoints]:
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images) -> List[List[Keypoints]]:
+        keys = [self._get_key(image) for image in images]
+        keypoints = [self._get(key) for key in keys]
+
+        missing_indices = [i for i, image_keypoints in enumerate(keypoints) if image_keypoints is None]
+        self.hits += len(images) - len(missing_indices)
+        self.misses += len(missing_indices)
+
+        if len(missing_indices) > 0:
+            detections = self._keypoint_detector.detect_batch([images[i] for i in missing_indices])
+            for i, image_keypoints in zip(missing_indices, detections):
+                self._put(keys[i], image_keypoints)
+                keypoints[i] = image_keypoints
+
+        return keypoints
+
+    def _get_key(self, image):
+        content_hash = hashlib.sha1(self._model_identity.encode('utf-8'))
+        if isinstance(image, str):
+            with open(image, 'rb') as image_file:
+                content_hash.update(image_file.read())
+        else:
+            content_hash.update(f'{image.shape}:{image.dtype}'.encode('utf-8'))
+            content_hash.update(np.ascontiguousarray(image).data)
+        return content_hash.hexdigest()
+
+    def _get_entry_path(self, key):
+        return os.path.join(self._cache_directory, key[:2], key + CACHE_ENTRY_EXTENSION)
+
+    def _get(self, key):
+        if key not in self._entries:
+            return None
+
+        entry_path = self._get_entry_path(key)
+        try:
+            with np.load(entry_path) as entry:
+                bounding_boxes, points = entry['bounding_boxes'], entry['points']
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError):
+            # Entry could be evicted by other process sharing the cache directory
+            self._size -= self._entries.pop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return [Keypoints.from_detection_result(bounding_box[:4], bounding_box[4], image_points)
+                for bounding_box, image_points in zip(bounding_boxes, points)]
+
+    def _put(self, key, keypoints: List[Keypoints]):
+        bounding_boxes = np.array([k.bounding_box_values for k in keypoints], dtype=np.float64).reshape(-1, 5)
+        points = np.array([k.points for k in keypoints]).reshape(-1, Keypoints.NUMBER_OF_JOINTS, 2)
+
+        # Entry is written to temporary file first, so other processes never read partially written entry
+        entry_path = self._get_entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        temporary_path = f'{entry_path}.{uuid.uuid4().hex}.tmp{CACHE_ENTRY_EXTENSION}'
+        np.savez(temporary_path, bounding_boxes=bounding_boxes, points=points)
+        os.replace(temporary_path, entry_path)
+
+        self._size -= self._entries.pop(key, 0)
+        self._entries[key] = os.path.getsize(entry_path)
+        self._size += self._entries[key]
+        self._evict()
+
+    def _evict(self):
+        while self._size > self._max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._get_entry_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _load_index(self):
+        entries = []
+        for directory_path, _, file_names in os.walk(self._cache_directory):
+            for file_name in file_names:
+                if not file_name.endswith(CACHE_ENTRY_EXTENSION) or '.tmp' in file_name:
+                    continue
+
+                entry_stat = os.stat(os.path.join(directory_path, file_name))
+                entries.append((entry_stat.st_mtime_ns, file_name[:-len(CACHE_ENTRY_EXTENSION)], entry_stat.st_size))
+
+        # Access time is kept in file modification time, so LRU order survives between runs
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
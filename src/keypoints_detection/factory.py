@@ -1,7 +1,20 @@
 from keypoints_detection.KeypointDetector import KeypointDetector
-from keypoints_detection.adapters.center_net import CenterNetKeypointDetectorAdapter
+from keypoints_detection.caching_detector import CachingKeypointDetector, DEFAULT_MAX_CACHE_SIZE, get_model_identity
 
 
-def create_keypoint_detector(model_path, network='center_net') -> KeypointDetector:
+def create_keypoint_detector(model_path, network='center_net', cache_directory=None,
+                             max_cache_size=DEFAULT_MAX_CACHE_SIZE) -> KeypointDetector:
     if network == 'center_net':
-        return CenterNetKeypointDetectorAdapter(model_path)
+        # CenterNet pulls in torch, so it is imported only when detector is created
+        from keypoints_detection.adapters.center_net import CenterNetKeypointDetectorAdapter
+        keypoint_detector = CenterNetKeypointDetectorAdapter(model_path)
+        detector_options = {'args': ' '.join(CenterNetKeypointDetectorAdapter.get_center_net_args(model_path))}
+    else:
+        raise ValueError(f'network = {network} not supported')
+
+    # Cache is enabled only for offline tools which pass directory explicitly, live video frames never repeat
+    if cache_directory:
+        model_identity = get_model_identity(model_path, network=network, **detector_options)
+        keypoint_detector = CachingKeypointDetector(keypoint_detector, cache_directory, model_identity, max_cache_size)
+
+    return keypoint_detector
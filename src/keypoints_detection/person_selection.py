@@ -0,0 +1,44 @@
+from typing import List
+
+from annotations import Keypoints
+from keypoints_detection.KeypointDetector import KeypointDetector
+
+
+def _bounding_box_area(keypoints: Keypoints):
+    lu_x, lu_y, rd_x, rd_y, _ = keypoints.bounding_box_values
+    return (rd_x - lu_x) * (rd_y - lu_y)
+
+
+def _confidence(keypoints: Keypoints):
+    return keypoints.bounding_box_values[4]
+
+
+PERSON_SELECTION_POLICIES = {
+    'all': lambda keypoints: list(keypoints),
+    'first': lambda keypoints: list(keypoints[:1]),
+    'largest': lambda keypoints: [max(keypoints, key=_bounding_box_area)] if len(keypoints) > 0 else [],
+    'most_confident': lambda keypoints: [max(keypoints, key=_confidence)] if len(keypoints) > 0 else []
+}
+
+
+def select_persons(keypoints: List[Keypoints], policy='all') -> List[Keypoints]:
+    if policy not in PERSON_SELECTION_POLICIES:
+        raise ValueError(f'person selection policy = {policy} not supported')
+
+    return PERSON_SELECTION_POLICIES[policy](keypoints)
+
+
+class PersonSelectionKeypointDetector(KeypointDetector):
+
+    def __init__(self, keypoint_detector: KeypointDetector, policy='all'):
+        if policy not in PERSON_SELECTION_POLICIES:
+            raise ValueError(f'person selection policy = {policy} not supported')
+
+        self._keypoint_detector = keypoint_detector
+        self._policy = policy
+
+    def detect(self, image) -> List[Keypoints]:
+        return select_persons(self._keypoint_detector.detect(image), self._policy)
+
+    def detect_batch(self, images) -> List[List[Keypoints]]:
+        return [select_persons(keypoints, self._policy) for keypoints in self._keypoint_detector.detect_batch(images)]
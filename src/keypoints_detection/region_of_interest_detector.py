@@ -0,0 +1,62 @@
+from typing import List
+
+import cv2
+import numpy as np
+
+from annotations import Keypoints
+from keypoints_detection.KeypointDetector import KeypointDetector
+
+
+class RegionOfInterestKeypointDetector(KeypointDetector):
+
+    def __init__(self, keypoint_detector: KeypointDetector, margin=0.25):
+        if margin < 0:
+            raise ValueError('margin should be greater or equal 0')
+
+        self._keypoint_detector = keypoint_detector
+        self._margin = margin
+        self._region_of_interest = None
+        self.cropped_detections = 0
+        self.full_frame_detections = 0
+
+    def detect(self, image) -> List[Keypoints]:
+        image = cv2.imread(image) if isinstance(image, str) else image
+        keypoints = []
+
+        if self._region_of_interest is not None:
+            left, top, right, bottom = self._region_of_interest
+            cropped_image = np.ascontiguousarray(image[top:bottom, left:right])
+            keypoints = [detection.translate(left, top) for detection in self._keypoint_detector.detect(cropped_image)]
+            self.cropped_detections += 1
+
+        # Nobody found in region of interest, person could have moved so whole frame is searched
+        if len(keypoints) == 0:
+            keypoints = self._keypoint_detector.detect(image)
+            self.full_frame_detections += 1
+
+        self._region_of_interest = self._get_region_of_interest(keypoints, image.shape)
+        return keypoints
+
+    def reset(self):
+        self._region_of_interest = None
+
+    def _get_region_of_interest(self, keypoints: List[Keypoints], image_shape):
+        if len(keypoints) == 0:
+            return None
+
+        # Points can be a little bit outside bounding box, so they are included in region too
+        coordinates = np.concatenate([np.concatenate([detection.bounding_box_values[:4].reshape(2, 2),
+                                                      detection.points]) for detection in keypoints])
+        left, top = coordinates.min(axis=0)
+        right, bottom = coordinates.max(axis=0)
+
+        margin_x = self._margin * (right - left)
+        margin_y = self._margin * (bottom - top)
+        height, width = image_shape[:2]
+
+        left, right = int(max(0, left - margin_x)), int(min(width, right + margin_x))
+        top, bottom = int(max(0, top - margin_y)), int(min(height, bottom + margin_y))
+        if right - left < 2 or bottom - top < 2:
+            return None
+
+        return left, top, right, bottom
@@ -0,0 +1,86 @@
+from typing import List
+
+import cv2
+import numpy as np
+
+from annotations import Keypoints
+from keypoints_detection.KeypointDetector import KeypointDetector
+
+
+class TrackingKeypointDetector(KeypointDetector):
+    OPTICAL_FLOW_PARAMETERS = dict(
+        winSize=(21, 21),
+        maxLevel=3,
+        criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+    )
+
+    def __init__(self, keypoint_detector: KeypointDetector, detection_interval=5, min_tracking_confidence=0.7):
+        if detection_interval < 1:
+            raise ValueError('detection_interval should be greater than 0')
+
+        self._keypoint_detector = keypoint_detector
+        self._detection_interval = detection_interval
+        self._min_tracking_confidence = min_tracking_confidence
+        self._previous_gray_image = None
+        self._previous_keypoints = []
+        self._frames_since_detection = 0
+        self.detector_calls = 0
+        self.tracked_frames = 0
+
+    @property
+    def detector_call_savings(self):
+        total_frames = self.detector_calls + self.tracked_frames
+        return self.tracked_frames / total_frames if total_frames > 0 else 0.0
+
+    def detect(self, image) -> List[Keypoints]:
+        image = cv2.imread(image) if isinstance(image, str) else image
+        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        keypoints = None
+        if self._previous_gray_image is not None and len(self._previous_keypoints) > 0 \
+                and self._frames_since_detection < self._detection_interval:
+            keypoints = self._track(gray_image)
+
+        if keypoints is None:
+            keypoints = self._keypoint_detector.detect(image)
+            self.detector_calls += 1
+            self._frames_since_detection = 1
+        else:
+            self.tracked_frames += 1
+            self._frames_since_detection += 1
+
+        self._previous_gray_image = gray_image
+        self._previous_keypoints = keypoints
+        return keypoints
+
+    def reset(self):
+        self._previous_gray_image = None
+        self._previous_keypoints = []
+
+    def _track(self, gray_image):
+        tracked_keypoints = []
+
+        for keypoints in self._previous_keypoints:
+            previous_points = keypoints.points.astype(np.float32).reshape(-1, 1, 2)
+            points, status, _ = cv2.calcOpticalFlowPyrLK(self._previous_gray_image, gray_image, previous_points,
+                                                         None, **self.OPTICAL_FLOW_PARAMETERS)
+
+            # Fraction of joints found by optical flow is used as tracking confidence. Lost points are moved by median
+            # motion of found ones, so person with no found points can't be tracked with any confidence threshold.
+            status = status.reshape(-1).astype(bool)
+            if not status.any() or status.mean() < self._min_tracking_confidence:
+                return None
+
+            points = points.reshape(Keypoints.NUMBER_OF_JOINTS, 2)
+            previous_points = previous_points.reshape(Keypoints.NUMBER_OF_JOINTS, 2)
+            points[~status] = previous_points[~status] + np.median(points[status] - previous_points[status], axis=0)
+            tracked_keypoints.append(self._move_keypoints(keypoints, points))
+
+        return tracked_keypoints
+
+    @staticmethod
+    def _move_keypoints(keypoints: Keypoints, points: np.ndarray) -> Keypoints:
+        displacement = np.median(points - keypoints.points, axis=0)
+        bounding_box = keypoints.bounding_box_values[:4] + np.tile(displacement, 2)
+        confidence = keypoints.bounding_box_values[4]
+        return Keypoints.from_detection_result(bounding_box=bounding_box, confidence=confidence, points=points)
@@ -0,0 +1,164 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import os.path as path
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from annotations import SUPPORTED_CLASSES
+from posture_detection import metrics
+from posture_detection.feature_cache import FeatureCache, get_feature_cache_key
+from posture_detection.simple_nn_model import SimpleNNModel
+from posture_detection.train_model import FEATURE_CACHE_DIRECTORY, load_features_and_labels
+
+PARAMETER_NAMES = ['hidden_size', 'activation', 'learning_rate', 'patience']
+
+# Set in every worker process by _initialize_worker
+_worker_state = {}
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Runs k-fold cross-validation of SimpleNNModel for every combination of "
+                                             "hyperparameters on a pool of processes and ranks them by accuracy")
+    ap.add_argument("-i", "--annotations_file_path", required=True,
+                    help="Path to annotations file (.csv, .npann or .parquet)")
+    ap.add_argument("-k", "--folds", required=False, type=int, default=5,
+                    help="Number of cross-validation folds")
+    ap.add_argument("--hidden_sizes", required=False, type=int, nargs='+', default=[4, 8, 16],
+                    help="Sizes of hidden layer")
+    ap.add_argument("--activations", required=False, nargs='+', default=['sigmoid', 'relu'],
+                    choices=['sigmoid', 'relu', 'tanh'],
+                    help="Activations of hidden layer")
+    ap.add_argument("--learning_rates", required=False, type=float, nargs='+', default=[0.001, 0.01],
+                    help="Learning rates of Adam optimizer")
+    ap.add_argument("--patiences", required=False, type=int, nargs='+', default=[20],
+                    help="Early stopping patience in epochs")
+    ap.add_argument("--epochs", required=False, type=int, default=5000,
+                    help="Maximum number of epochs of each training")
+    ap.add_argument("-w", "--workers", required=False, type=int, default=os.cpu_count(),
+                    help="Number of worker processes, TensorFlow threads are split evenly between them")
+    ap.add_argument("-o", "--output_file_path", required=False, default=None,
+                    help="Path to csv file with ranked results")
+    ap.add_argument("-c", "--feature_cache_directory", required=False, default=FEATURE_CACHE_DIRECTORY,
+                    help="Directory where preprocessed features are cached between runs, empty string disables cache")
+    ap.add_argument("--rebuild_feature_cache", required=False, action='store_true',
+                    help="Preprocesses annotations again even if cached features are available")
+    ap.add_argument("--seed", required=False, type=int, default=0,
+                    help="Seed of fold split and weights initialization")
+    return ap.parse_args()
+
+
+def create_parameter_grid(hidden_sizes, activations, learning_rates, patiences):
+    return [dict(zip(PARAMETER_NAMES, values))
+            for values in itertools.product(hidden_sizes, activations, learning_rates, patiences)]
+
+
+def _initialize_worker(cache_directory, key, folds, seed, threads):
+    # Pinned before TensorFlow creates its thread pools, so workers together use each core once
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    # Progress bars of many workers would interleave in one console
+    tf.keras.utils.disable_interactive_logging()
+
+    from sklearn.model_selection import StratifiedKFold
+
+    # Features are memory mapped from the cache entry, so all workers share the same read-only pages
+    features, labels = FeatureCache(cache_directory).get(key)
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    _worker_state.update(features=features, labels=labels, seed=seed,
+                         folds=list(splitter.split(np.zeros(len(labels)), labels)))
+
+
+def _run_fold(parameters, fold_index, epochs):
+    import tensorflow as tf
+
+    features, labels = _worker_state['features'], _worker_state['labels']
+    train_indices, test_indices = _worker_state['folds'][fold_index]
+    tf.keras.utils.set_random_seed(_worker_state['seed'] + fold_index)
+
+    start_time = time.perf_counter()
+    model = SimpleNNModel(None, **parameters)
+    history = model.fit(features[train_indices], features[test_indices], labels[train_indices],
+                        labels[test_indices], epochs, verbose=0)
+    predictions = model.predict_features(features[test_indices])
+    tf.keras.backend.clear_session()
+
+    return {
+        **parameters,
+        'fold': fold_index,
+        'accuracy': metrics.accuracy(labels[test_indices], predictions),
+        'val_loss': min(history.history['val_loss']),
+        'epochs': len(history.history['loss']),
+        'training_time': time.perf_counter() - start_time
+    }
+
+
+def run_cross_validation(cache_directory, key, parameter_grid, folds, epochs, workers, seed=0):
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # Spawned workers don't inherit state of parent process, TensorFlow is not fork safe
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_initialize_worker,
+                             initargs=(cache_directory, key, folds, seed, threads)) as executor:
+        futures = [executor.submit(_run_fold, parameters, fold_index, epochs)
+                   for parameters in parameter_grid for fold_index in range(folds)]
+
+        fold_results = []
+        for i, future in enumerate(as_completed(futures)):
+            fold_results.append(future.result())
+            print('{0}/{1} folds done'.format(i + 1, len(futures)))
+
+    return pd.DataFrame(fold_results)
+
+
+def rank_results(fold_results: pd.DataFrame) -> pd.DataFrame:
+    results = fold_results.groupby(PARAMETER_NAMES, as_index=False).agg(
+        accuracy_mean=('accuracy', 'mean'),
+        accuracy_std=('accuracy', 'std'),
+        val_loss_mean=('val_loss', 'mean'),
+        epochs_mean=('epochs', 'mean'),
+        training_time=('training_time', 'sum'))
+    results = results.sort_values(['accuracy_mean', 'val_loss_mean'], ascending=[False, True], ignore_index=True)
+    results.insert(0, 'rank', np.arange(1, len(results) + 1))
+    return results
+
+
+def main(args):
+    if not path.exists(args.annotations_file_path):
+        print("File {0} doesn't exist".format(args.annotations_file_path))
+        return
+
+    pipeline = SimpleNNModel.PREPROCESSING_PIPELINE
+    parameter_grid = create_parameter_grid(args.hidden_sizes, args.activations, args.learning_rates, args.patiences)
+    workers = max(1, min(args.workers, len(parameter_grid) * args.folds))
+
+    # Without feature cache, features are shared with workers through temporary cache
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        cache_directory = args.feature_cache_directory or temporary_directory
+        load_features_and_labels(pipeline, args.annotations_file_path, FeatureCache(cache_directory),
+                                 args.rebuild_feature_cache)
+        key = get_feature_cache_key(args.annotations_file_path, pipeline, SUPPORTED_CLASSES)
+
+        print('Cross-validating {0} parameter sets with {1} folds on {2} workers'.format(
+            len(parameter_grid), args.folds, workers))
+        fold_results = run_cross_validation(cache_directory, key, parameter_grid, args.folds, args.epochs, workers,
+                                            args.seed)
+
+    results = rank_results(fold_results)
+    print(results.to_string(index=False, float_format='{0:.4f}'.format))
+
+    if args.output_file_path is not None:
+        results.to_csv(args.output_file_path, index=False)
+
+    return results
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
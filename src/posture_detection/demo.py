@@ -1,13 +1,24 @@
 import argparse
 import os.path as path
+import time
+from typing import List
 
 import cv2
+import numpy as np
 
-from annotations import SUPPORTED_CLASSES, ImageAnnotation, Keypoints
+from annotations import SUPPORTED_CLASSES, Keypoints, KeypointsBatch
 from drawing.image_overlay import ImageOverlayPipeline, BoundingBoxImageOverlayStep, KeypointsImageOverlayStep, \
     ClassNameImageOverlay
 from keypoints_detection.factory import create_keypoint_detector
-from posture_detection.simple_nn_model import SimpleNNModel, PostureDetectionModel
+from keypoints_detection.person_selection import PersonSelectionKeypointDetector, PERSON_SELECTION_POLICIES
+from keypoints_detection.region_of_interest_detector import RegionOfInterestKeypointDetector
+from keypoints_detection.tracking_detector import TrackingKeypointDetector
+from posture_detection.factory import create_posture_detection_model
+from posture_detection.frame_results import FrameResultsWriter
+from posture_detection.frame_scheduler import AdaptiveFrameScheduler, DEFAULT_VIDEO_FPS
+from posture_detection.posture_detection_model import PostureDetectionModel
+from posture_detection.stage_metrics import StageMetrics, DISABLED_STAGE_METRICS
+from posture_detection.video_pipeline import VideoPipeline, VideoFrame
 
 BOUNDING_BOX_COLOR = (0, 255, 255)
 KEYPOINT_COLOR = (0, 255, 0)
@@ -16,6 +27,29 @@ CLASS_NAME_TO_COLOR = {
     SUPPORTED_CLASSES[0]: (0, 0, 255),
     SUPPORTED_CLASSES[1]: (0, 255, 0)
 }
+VIDEO_CODECS = {
+    '.avi': 'MJPG',
+    '.mp4': 'mp4v'
+}
+
+
+# Overlay steps are created once per video and reused between frames, only their data is updated. Overlay is not
+# thread safe, it should be used by the thread which draws frames.
+class PostureOverlay:
+
+    def __init__(self, show_labels=True):
+        self._bounding_box_overlay = BoundingBoxImageOverlayStep(None, color=BOUNDING_BOX_COLOR)
+        self._keypoints_overlay = KeypointsImageOverlayStep(None, keypoint_color=KEYPOINT_COLOR,
+                                                            text_color=TEXT_COLOR, show_labels=show_labels)
+        self._class_name_overlay = ClassNameImageOverlay(SUPPORTED_CLASSES[0], CLASS_NAME_TO_COLOR)
+        self._pipeline = ImageOverlayPipeline([self._bounding_box_overlay, self._keypoints_overlay,
+                                               self._class_name_overlay])
+
+    def apply(self, image, keypoints, class_name, class_name_localization=ClassNameImageOverlay.TEXT_LOCALIZATION):
+        self._bounding_box_overlay.update(keypoints.bounding_box)
+        self._keypoints_overlay.update(keypoints)
+        self._class_name_overlay.update(class_name, class_name_localization)
+        return self._pipeline.apply(image)
 
 
 def parse_args():
@@ -26,6 +60,45 @@ def parse_args():
                     help="Path to trained model")
     ap.add_argument("-k", "--keypoint_detector_model_path", required=True,
                     help="Path to keypoint detection model")
+    ap.add_argument("-e", "--inference_engine", required=False, default='auto', choices=['auto', 'numpy', 'keras'],
+                    help="Posture detection inference engine. 'numpy' runs exported weights without TensorFlow, "
+                         "'auto' selects it when model directory contains weights.npz")
+    ap.add_argument("-t", "--tracking_interval", required=False, type=int, default=1,
+                    help="Keypoint detector runs every tracking_interval frames, keypoints in frames between "
+                         "are tracked with optical flow. Value 1 disables tracking")
+    ap.add_argument("-r", "--roi_margin", required=False, type=float, default=None,
+                    help="Enables cropping frame around previous detection before running keypoint detector. "
+                         "Margin is a fraction of detection size added on each side, e.g. 0.25")
+    ap.add_argument("-s", "--person_selection", required=False, default='all',
+                    choices=list(PERSON_SELECTION_POLICIES.keys()),
+                    help="Which detected persons are classified, by default every person in frame")
+    ap.add_argument("-b", "--batch_size", required=False, type=int, default=1,
+                    help="Number of frames passed to keypoint detector at once")
+    ap.add_argument("--pipelined", action='store_true',
+                    help="Runs decoding, detection, classification and display in separate threads")
+    ap.add_argument("--queue_size", required=False, type=int, default=2,
+                    help="Size of queues between pipeline stages, used with --pipelined")
+    ap.add_argument("--target_fps", required=False, type=float, default=None,
+                    help="Number of frames per second processed by posture detection. By default frames are "
+                         "processed as often as detection latency allows to keep up with video")
+    ap.add_argument("--latency_budget_ms", required=False, type=float, default=None,
+                    help="Maximum delay of displayed frame behind video time, frames are skipped when exceeded")
+    ap.add_argument("--headless", action='store_true',
+                    help="Processes every frame as fast as possible without GUI and writes per frame results to "
+                         "results_file_path")
+    ap.add_argument("--results_file_path", required=False, default=None,
+                    help="Path to csv file with per frame results written in headless mode, compressed when name "
+                         "ends with .gz. Defaults to <video_file_name>_postures.csv.gz next to video file")
+    ap.add_argument("--output_video_path", required=False, default=None,
+                    help="Path to annotated video written in headless mode (.avi or .mp4). Overlays are drawn only "
+                         "when it is set")
+    ap.add_argument("--low_detail_overlay", action='store_true',
+                    help="Draws keypoints without joint names, which makes rendering several times faster")
+    ap.add_argument("--metrics_file_path", required=False, default=None,
+                    help="Enables per stage latency metrics, exported periodically to given file. Files with .prom "
+                         "or .txt extension are written in Prometheus text format, other ones as JSON lines")
+    ap.add_argument("--metrics_interval", required=False, type=float, default=10.0,
+                    help="Number of seconds between metrics exports")
     return ap.parse_args()
 
 
@@ -43,66 +116,274 @@ def main(args):
         return
 
     keypoint_detector = create_keypoint_detector(args.keypoint_detector_model_path)
-    posture_detector = SimpleNNModel(args.posture_detector_model_path, load_weights=True)
+    if args.roi_margin is not None:
+        keypoint_detector = RegionOfInterestKeypointDetector(keypoint_detector, margin=args.roi_margin)
+    if args.person_selection != 'all':
+        keypoint_detector = PersonSelectionKeypointDetector(keypoint_detector, policy=args.person_selection)
+    if args.tracking_interval > 1:
+        keypoint_detector = TrackingKeypointDetector(keypoint_detector, detection_interval=args.tracking_interval)
+    posture_detector = create_posture_detection_model(args.posture_detector_model_path, args.inference_engine)
+    overlay = PostureOverlay(show_labels=not args.low_detail_overlay)
+    metrics = DISABLED_STAGE_METRICS
+    if args.metrics_file_path is not None:
+        metrics = StageMetrics(args.metrics_file_path, export_interval=args.metrics_interval)
+
+    if args.headless:
+        results_file_path = args.results_file_path or path.splitext(args.video_file_path)[0] + '_postures.csv.gz'
+        process_video_headless(args.video_file_path, keypoint_detector, posture_detector, results_file_path,
+                               args.output_video_path, args.batch_size, metrics, overlay)
+    elif args.pipelined:
+        process_video_pipelined(args.video_file_path, keypoint_detector, posture_detector, args.queue_size,
+                                metrics, overlay)
+    else:
+        latency_budget = args.latency_budget_ms / 1000 if args.latency_budget_ms is not None else None
+        process_video(args.video_file_path, keypoint_detector, posture_detector, args.batch_size,
+                      args.target_fps, latency_budget, metrics, overlay)
 
-    process_video(args.video_file_path, keypoint_detector, posture_detector)
+    if metrics.enabled:
+        metrics.close()
+        print(metrics)
+
+    if isinstance(keypoint_detector, TrackingKeypointDetector):
+        print(f'Keypoint detector calls: {keypoint_detector.detector_calls}, '
+              f'tracked frames: {keypoint_detector.tracked_frames}, '
+              f'saved calls: {100 * keypoint_detector.detector_call_savings:.1f}%')
 
 
 def run_posture_detection(frame, keypoints: Keypoints, posture_detector: PostureDetectionModel):
-    height, width, channels = frame.shape
-    frame_annotation = ImageAnnotation.from_parameters('', (height, width), '', keypoints)
-    predictions = posture_detector.predict(frame_annotation.to_dataframe())
+    predictions = posture_detector.predict(keypoints)
     return SUPPORTED_CLASSES[predictions[0]]
 
 
-def process_frame(frame, keypoint_detector, posture_detector):
-    keypoints = keypoint_detector.detect(frame)
+def run_posture_detection_batch(keypoints: List[Keypoints], posture_detector: PostureDetectionModel,
+                                metrics: StageMetrics = DISABLED_STAGE_METRICS):
+    return [class_name for class_name, _ in run_posture_classification_batch(keypoints, posture_detector, metrics)]
+
+
+def run_posture_classification_batch(keypoints: List[Keypoints], posture_detector: PostureDetectionModel,
+                                     metrics: StageMetrics = DISABLED_STAGE_METRICS):
     if len(keypoints) == 0:
-        return
+        return []
+
+    # Preprocessing and prediction are run separately so their latencies can be measured on their own
+    with metrics.measure('preprocessing'):
+        keypoints = keypoints[0] if len(keypoints) == 1 else KeypointsBatch.from_keypoints_list(keypoints)
+        features = posture_detector.PREPROCESSING_PIPELINE.run_array(keypoints)
+
+    with metrics.measure('prediction'):
+        scores = posture_detector.predict_scores(features)
+
+    # Confidence is a score of predicted class
+    predictions = np.round(scores).astype('int32')
+    return [(SUPPORTED_CLASSES[prediction], float(score if prediction == 1 else 1 - score))
+            for prediction, score in zip(predictions, scores)]
+
+
+def process_frame(frame, keypoint_detector, posture_detector, metrics: StageMetrics = DISABLED_STAGE_METRICS,
+                  overlay: PostureOverlay = None):
+    process_frames([frame], keypoint_detector, posture_detector, metrics, overlay)
 
-    # We process only first detection
-    keypoints = keypoints[0]
 
-    class_name = run_posture_detection(frame, keypoints, posture_detector)
-    put_annotations_on_image(frame, keypoints, class_name)
+def process_frames(frames, keypoint_detector, posture_detector, metrics: StageMetrics = DISABLED_STAGE_METRICS,
+                   overlay: PostureOverlay = None):
+    overlay = overlay or PostureOverlay()
+    for frame, result in zip(frames, detect_postures(frames, keypoint_detector, posture_detector, metrics)):
+        with metrics.measure('drawing'):
+            put_result_on_image(frame, result, overlay)
 
 
-def put_annotations_on_image(image, keypoints, class_name):
-    image_overlay = ImageOverlayPipeline([
-        BoundingBoxImageOverlayStep(keypoints.bounding_box, color=BOUNDING_BOX_COLOR),
-        KeypointsImageOverlayStep(keypoints, keypoint_color=KEYPOINT_COLOR, text_color=TEXT_COLOR),
-        ClassNameImageOverlay(class_name, CLASS_NAME_TO_COLOR)
-    ])
+def detect_postures(frames, keypoint_detector, posture_detector, metrics: StageMetrics = DISABLED_STAGE_METRICS):
+    return [[(keypoints, class_name) for keypoints, class_name, _ in result]
+            for result in detect_postures_with_confidence(frames, keypoint_detector, posture_detector, metrics)]
 
-    image_overlay.apply(image)
 
+def detect_postures_with_confidence(frames, keypoint_detector, posture_detector,
+                                    metrics: StageMetrics = DISABLED_STAGE_METRICS):
+    with metrics.measure('detection'):
+        frames_keypoints = keypoint_detector.detect_batch(frames)
 
-def process_video(video_file_path, keypoint_detector, posture_detector):
-    frame_num = 1
-    display_interval = 3
+    # All persons from all frames are classified with single predict call
+    classifications = iter(run_posture_classification_batch(
+        [keypoints for frame_keypoints in frames_keypoints for keypoints in frame_keypoints], posture_detector,
+        metrics))
+
+    return [[(keypoints,) + next(classifications) for keypoints in frame_keypoints]
+            for frame_keypoints in frames_keypoints]
+
+
+def put_result_on_image(image, result, overlay: PostureOverlay):
+    if result is None:
+        return
+
+    for keypoints, class_name in result:
+        # With many persons in frame class name is displayed next to each person
+        class_name_localization = ClassNameImageOverlay.TEXT_LOCALIZATION if len(result) == 1 else \
+            (int(keypoints.bounding_box[0][0]), max(int(keypoints.bounding_box[0][1]) - 10, 25))
+        overlay.apply(image, keypoints, class_name, class_name_localization)
+
+
+def display_frames(frames):
+    for frame in frames:
+        cv2.imshow('frame', frame)
+        _ = cv2.waitKeyEx(1)
+
+
+def process_video(video_file_path, keypoint_detector, posture_detector, batch_size=1, target_fps=None,
+                  latency_budget=None, metrics: StageMetrics = DISABLED_STAGE_METRICS, overlay: PostureOverlay = None):
+    overlay = overlay or PostureOverlay()
+    frame_num = 0
     cap = cv2.VideoCapture(video_file_path)
+    scheduler = AdaptiveFrameScheduler(cap.get(cv2.CAP_PROP_FPS), target_fps, latency_budget)
+    last_result = None
+    pending_frames = []
 
     while True:
         # Capture frame-by-frame
-        ret, frame = cap.read()
+        with metrics.measure('decode'):
+            ret, frame = cap.read()
         if ret < 0 or frame is None:
             break
 
         frame_num += 1
-        if frame_num % display_interval > 0:
+        should_process = scheduler.should_process(frame_num)
+        metrics.count('processed' if should_process else 'skipped')
+        pending_frames.append((frame, should_process))
+        if sum(should_process for _, should_process in pending_frames) < batch_size:
             continue
 
-        process_frame(frame, keypoint_detector, posture_detector)
+        last_result = process_pending_frames(pending_frames, last_result, keypoint_detector, posture_detector,
+                                             scheduler, overlay, metrics)
+        pending_frames = []
 
-        # Display the resulting frame
-        cv2.imshow('frame', frame)
-        _ = cv2.waitKeyEx(1)
+    process_pending_frames(pending_frames, last_result, keypoint_detector, posture_detector, scheduler, overlay,
+                           metrics)
+    print(f'Processed {scheduler.processed_count} frames, skipped {scheduler.skipped_count} frames')
 
     # When everything done, release the capture
     cap.release()
     cv2.destroyAllWindows()
 
 
+def process_pending_frames(pending_frames, last_result, keypoint_detector, posture_detector, scheduler,
+                           overlay: PostureOverlay, metrics: StageMetrics = DISABLED_STAGE_METRICS):
+    frames_to_process = [frame for frame, should_process in pending_frames if should_process]
+
+    if len(frames_to_process) > 0:
+        start_time = time.monotonic()
+        results = iter(detect_postures(frames_to_process, keypoint_detector, posture_detector, metrics))
+        scheduler.update((time.monotonic() - start_time) / len(frames_to_process))
+
+    # Frames skipped by scheduler reuse result of the last processed frame
+    for frame, should_process in pending_frames:
+        if should_process:
+            last_result = next(results)
+        with metrics.measure('drawing'):
+            put_result_on_image(frame, last_result, overlay)
+
+        # Display the resulting frame
+        with metrics.measure('display'):
+            display_frames([frame])
+
+    return last_result
+
+
+def process_video_headless(video_file_path, keypoint_detector, posture_detector, results_file_path,
+                           output_video_path=None, batch_size=1, metrics: StageMetrics = DISABLED_STAGE_METRICS,
+                           overlay: PostureOverlay = None):
+    overlay = overlay or PostureOverlay()
+    cap = cv2.VideoCapture(video_file_path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_VIDEO_FPS
+    video_writer = None
+    if output_video_path is not None:
+        video_writer = create_video_writer(output_video_path, video_fps, (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                                                          int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))))
+
+    frame_num = 0
+    start_time = time.monotonic()
+    with FrameResultsWriter(results_file_path) as results_writer:
+        while True:
+            frames = read_frames(cap, batch_size, metrics)
+            if len(frames) == 0:
+                break
+
+            results = detect_postures_with_confidence(frames, keypoint_detector, posture_detector, metrics)
+            for frame, result in zip(frames, results):
+                results_writer.write(frame_num, frame_num / video_fps, result)
+                frame_num += 1
+                metrics.count('processed')
+
+                # Overlays are drawn only for output video
+                if video_writer is not None:
+                    with metrics.measure('drawing'):
+                        put_result_on_image(frame, [(keypoints, class_name) for keypoints, class_name, _ in result],
+                                            overlay)
+                    with metrics.measure('encode'):
+                        video_writer.write(frame)
+
+    elapsed_time = time.monotonic() - start_time
+    print(f'Processed {frame_num} frames in {elapsed_time:.1f} s '
+          f'({frame_num / elapsed_time if elapsed_time > 0 else 0.0:.1f} fps), results saved to {results_file_path}')
+
+    cap.release()
+    if video_writer is not None:
+        video_writer.release()
+
+
+def read_frames(cap, count, metrics: StageMetrics = DISABLED_STAGE_METRICS):
+    frames = []
+    while len(frames) < count:
+        with metrics.measure('decode'):
+            ret, frame = cap.read()
+        if not ret or frame is None:
+            break
+        frames.append(frame)
+
+    return frames
+
+
+def create_video_writer(output_video_path, fps, frame_size):
+    extension = path.splitext(output_video_path)[-1].lower()
+    if extension not in VIDEO_CODECS:
+        raise ValueError(f'Unsupported output video format {extension}, '
+                         f'supported formats: {", ".join(VIDEO_CODECS.keys())}')
+
+    return cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*VIDEO_CODECS[extension]), fps, frame_size)
+
+
+def process_video_pipelined(video_file_path, keypoint_detector, posture_detector, queue_size=2,
+                            metrics: StageMetrics = DISABLED_STAGE_METRICS, overlay: PostureOverlay = None):
+    # Frames are drawn only by output stage, so single overlay is enough
+    overlay = overlay or PostureOverlay()
+
+    def detect_keypoints(video_frame: VideoFrame):
+        video_frame.keypoints = keypoint_detector.detect(video_frame.image)
+        return video_frame
+
+    def classify_posture(video_frame: VideoFrame):
+        video_frame.class_names = run_posture_detection_batch(video_frame.keypoints, posture_detector, metrics)
+        return video_frame
+
+    def display_frame(video_frame: VideoFrame):
+        with metrics.measure('drawing'):
+            put_result_on_image(video_frame.image, list(zip(video_frame.keypoints, video_frame.class_names)),
+                                overlay)
+        with metrics.measure('display'):
+            display_frames([video_frame.image])
+
+    cap = cv2.VideoCapture(video_file_path)
+    pipeline = VideoPipeline(cap, [
+        ('keypoint detection', detect_keypoints),
+        ('posture classification', classify_posture)
+    ], display_frame, queue_size=queue_size, metrics=metrics)
+
+    try:
+        for stage_statistics in pipeline.run():
+            print(stage_statistics)
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
+
+
 if __name__ == '__main__':
     args = parse_args()
     main(args)
@@ -0,0 +1,28 @@
+import argparse
+import os.path as path
+
+from posture_detection.simple_nn_model import SimpleNNModel
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Exports weights of trained posture detection model to NumPy array file, "
+                                             "which can be used for inference without TensorFlow")
+    ap.add_argument("-m", "--model_path", required=True,
+                    help="Path to trained model")
+    ap.add_argument("-o", "--output_file_path", required=False, default=None,
+                    help="Path to output file, defaults to weights.npz in model directory")
+    return ap.parse_args()
+
+
+def main(args):
+    if not path.exists(args.model_path):
+        print("Model {0} doesn't exist".format(args.model_path))
+        return
+
+    model = SimpleNNModel(args.model_path, load_weights=True)
+    model.export_weights(args.output_file_path)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
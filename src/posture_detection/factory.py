@@ -0,0 +1,20 @@
+import os.path as path
+
+from posture_detection.numpy_nn_model import NumpyNNModel, NUMPY_WEIGHTS_FILE_NAME
+from posture_detection.posture_detection_model import PostureDetectionModel
+
+
+def create_posture_detection_model(model_path, inference_engine='auto') -> PostureDetectionModel:
+    if inference_engine == 'auto':
+        has_numpy_weights = path.exists(path.join(model_path, NUMPY_WEIGHTS_FILE_NAME))
+        inference_engine = 'numpy' if has_numpy_weights else 'keras'
+
+    if inference_engine == 'numpy':
+        return NumpyNNModel(model_path)
+
+    if inference_engine == 'keras':
+        # TensorFlow is imported only when Keras model is requested
+        from posture_detection.simple_nn_model import SimpleNNModel
+        return SimpleNNModel(model_path, load_weights=True)
+
+    raise ValueError(f'inference_engine = {inference_engine} not supported')
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from posture_detection.preprocessing import PreProcessingPipeline
+
+FEATURES_FILE_NAME = 'features.npy'
+LABELS_FILE_NAME = 'labels.npy'
+METADATA_FILE_NAME = 'metadata.json'
+FEATURE_CACHE_VERSION = 1
+
+
+def get_file_fingerprint(file_path, chunk_size=1024 ** 2):
+    # Content based, so copied or touched annotation files still hit the cache. Directories (.npann) are hashed
+    # file by file in sorted order.
+    if os.path.isdir(file_path):
+        file_paths = sorted(os.path.join(directory_path, file_name)
+                            for directory_path, _, file_names in os.walk(file_path) for file_name in file_names)
+    else:
+        file_paths = [file_path]
+
+    fingerprint = hashlib.sha1()
+    for current_file_path in file_paths:
+        fingerprint.update(os.path.relpath(current_file_path, file_path).encode('utf-8'))
+        with open(current_file_path, 'rb') as current_file:
+            for chunk in iter(lambda: current_file.read(chunk_size), b''):
+                fingerprint.update(chunk)
+    return fingerprint.hexdigest()
+
+
+def get_feature_cache_key(annotations_file_path, pipeline: PreProcessingPipeline, classes: List[str]):
+    description = json.dumps({
+        'version': FEATURE_CACHE_VERSION,
+        'annotations': get_file_fingerprint(annotations_file_path),
+        'pipeline': pipeline.describe(),
+        'classes': classes
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+
+# Preprocessed features and labels are stored as .npy files, one directory per key, and are loaded memory mapped,
+# so repeated training runs on unchanged data and pipeline skip reading and preprocessing annotations.
+class FeatureCache:
+
+    def __init__(self, cache_directory):
+        self._cache_directory = cache_directory
+
+    def get_entry_path(self, key):
+        return os.path.join(self._cache_directory, key)
+
+    def get(self, key) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        entry_path = self.get_entry_path(key)
+        try:
+            features = np.load(os.path.join(entry_path, FEATURES_FILE_NAME), mmap_mode='r')
+            labels = np.load(os.path.join(entry_path, LABELS_FILE_NAME), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        if len(features) != len(labels):
+            return None
+        return features, labels
+
+    def put(self, key, features: np.ndarray, labels: np.ndarray, metadata: Optional[dict] = None):
+        os.makedirs(self._cache_directory, exist_ok=True)
+
+        # Entry is written to temporary directory first, so other runs never read partially written entry
+        entry_path = self.get_entry_path(key)
+        temporary_path = f'{entry_path}.{uuid.uuid4().hex}.tmp'
+        os.makedirs(temporary_path)
+        np.save(os.path.join(temporary_path, FEATURES_FILE_NAME), np.ascontiguousarray(features))
+        np.save(os.path.join(temporary_path, LABELS_FILE_NAME), np.ascontiguousarray(labels))
+        with open(os.path.join(temporary_path, METADATA_FILE_NAME), 'w') as metadata_file:
+            json.dump(metadata or {}, metadata_file, indent=2, default=str)
+
+        self.remove(key)
+        try:
+            os.rename(temporary_path, entry_path)
+        except OSError:
+            # Other run stored the same entry in the meantime
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+    def remove(self, key):
+        shutil.rmtree(self.get_entry_path(key), ignore_errors=True)
@@ -0,0 +1,36 @@
+import csv
+import gzip
+from typing import List, Tuple
+
+from annotations import Keypoints
+
+
+class FrameResultsWriter:
+    COLUMN_NAMES = ['frame_index', 'timestamp', 'person', 'class', 'class_confidence'] + Keypoints.ATTRIBUTE_NAMES
+
+    def __init__(self, file_path, precision=2):
+        # Results are streamed row by row, so hours of footage don't have to be kept in memory
+        self._file = gzip.open(file_path, 'wt', newline='') if file_path.endswith('.gz') \
+            else open(file_path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.COLUMN_NAMES)
+        self._precision = precision
+
+    def write(self, frame_index, timestamp, results: List[Tuple[Keypoints, str, float]]):
+        # Frame without detections is written as single empty row, so every processed frame is present in file
+        if len(results) == 0:
+            self._writer.writerow([frame_index, round(timestamp, 3)] + [''] * (len(self.COLUMN_NAMES) - 2))
+
+        for person, (keypoints, class_name, confidence) in enumerate(results):
+            values = list(keypoints.bounding_box_values) + list(keypoints.points.reshape(-1))
+            self._writer.writerow([frame_index, round(timestamp, 3), person, class_name, round(confidence, 4)] +
+                                  [round(float(value), self._precision) for value in values])
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,65 @@
+import time
+from collections import deque
+
+DEFAULT_VIDEO_FPS = 30.0
+
+
+class AdaptiveFrameScheduler:
+
+    def __init__(self, video_fps, target_fps=None, latency_budget=None, window_size=30):
+        if target_fps is not None and target_fps <= 0:
+            raise ValueError('target_fps should be greater than 0')
+
+        if latency_budget is not None and latency_budget <= 0:
+            raise ValueError('latency_budget should be greater than 0')
+
+        self._video_fps = video_fps if video_fps and video_fps > 0 else DEFAULT_VIDEO_FPS
+        self._target_fps = target_fps
+        self._latency_budget = latency_budget
+        self._latencies = deque(maxlen=window_size)
+        self._next_frame_to_process = 0.0
+        self._last_processed_frame = None
+        self._start_time = None
+        self.processed_count = 0
+        self.skipped_count = 0
+
+    @property
+    def latency(self):
+        return sum(self._latencies) / len(self._latencies) if self._latencies else 0.0
+
+    @property
+    def frame_interval(self):
+        processing_fps = self._video_fps if self._target_fps is None else min(self._target_fps, self._video_fps)
+        if self.latency > 0:
+            processing_fps = min(processing_fps, 1 / self.latency)
+
+        return max(1.0, self._video_fps / processing_fps)
+
+    def should_process(self, frame_num) -> bool:
+        if self._start_time is None:
+            self._start_time = time.monotonic() - frame_num / self._video_fps
+
+        if frame_num < self._next_frame_to_process or \
+                (self._is_over_latency_budget(frame_num) and not self._is_result_outdated(frame_num)):
+            self.skipped_count += 1
+            return False
+
+        self._next_frame_to_process = frame_num + self.frame_interval
+        self._last_processed_frame = frame_num
+        self.processed_count += 1
+        return True
+
+    def update(self, latency):
+        self._latencies.append(latency)
+
+    def _is_result_outdated(self, frame_num):
+        # Result is refreshed at least once per second of video even if we can't catch up
+        return self._last_processed_frame is None or frame_num - self._last_processed_frame >= self._video_fps
+
+    def _is_over_latency_budget(self, frame_num):
+        if self._latency_budget is None:
+            return False
+
+        # Frame would be displayed after its playback time plus the budget, skip it to catch up
+        lag = time.monotonic() - self._start_time - frame_num / self._video_fps
+        return lag + self.latency > self._latency_budget
@@ -1,73 +1,182 @@
 import argparse
+import json
+import os
 import os.path as path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
+import numpy as np
 import pandas as pd
-import tensorflow as tf
 
+from annotation_storage import read_annotations
 from annotations import SUPPORTED_CLASSES
-from posture_detection.simple_nn_model import SimpleNNModel
+from posture_detection import metrics
+from posture_detection.factory import create_posture_detection_model
+
+CONTACT_SHEET_GRID = (4, 4)
+CONTACT_SHEET_TILE_SIZE = (320, 240)
+CAPTION_COLOR = (0, 255, 0)
 
 
 def parse_args():
     ap = argparse.ArgumentParser(description="Evaluates trained posture detection model")
     ap.add_argument("-i", "--annotations_file_path", required=True,
-                    help="Path to annotations in csv format")
+                    help="Path to annotations file (.csv, .npann or .parquet)")
     ap.add_argument("-m", "--model_path", required=True,
                     help="Path to trained model")
+    ap.add_argument("-r", "--report_directory", required=False, default=None,
+                    help="Directory where metrics, threshold sweep and contact sheets of misclassified images are "
+                         "written. When set, nothing is displayed, so inspection can run headless")
+    ap.add_argument("-w", "--workers", required=False, type=int, default=8,
+                    help="Number of threads loading misclassified images")
+    ap.add_argument("-n", "--max_invalid_images", required=False, type=int, default=None,
+                    help="Maximum number of misclassified images displayed or written to contact sheets")
+    ap.add_argument("--thresholds", required=False, type=int, default=101,
+                    help="Number of thresholds evaluated between 0 and 1 in threshold sweep")
     return ap.parse_args()
 
 
-def get_predictions_and_labels(model_path, annotations_data_frame):
-    model = SimpleNNModel(model_path, load_weights=True)
+def get_predictions_scores_and_labels(model_path, annotations_data_frame):
+    model = create_posture_detection_model(model_path)
     labels = pd.Categorical(annotations_data_frame['class'], categories=SUPPORTED_CLASSES).codes
-    predictions = model.predict(annotations_data_frame)
-    return predictions, labels
+
+    # Scores are computed once for the whole dataset, predictions and all metrics are derived from them
+    features = model.PREPROCESSING_PIPELINE.run_array(annotations_data_frame)
+    scores = model.predict_scores(features.astype(np.float32))
+    predictions = np.round(scores).astype('int32')
+    return predictions, scores, labels
 
 
 def main(args):
     if not path.exists(args.annotations_file_path):
-        print("File {0} doesn't exist".format(args.video_file_path))
+        print("File {0} doesn't exist".format(args.annotations_file_path))
         return
 
     if not path.exists(args.model_path):
         print("Model {0} doesn't exist".format(args.model_path))
         return
 
-    annotations_data_frame = pd.read_csv(args.annotations_file_path)
-    predictions, labels = get_predictions_and_labels(args.model_path, annotations_data_frame)
+    annotations_data_frame = read_annotations(args.annotations_file_path)
+    predictions, scores, labels = get_predictions_scores_and_labels(args.model_path, annotations_data_frame)
 
     print('Model {0} evaluation:'.format(args.model_path))
-    evaluate_confusion_matrix(labels, predictions)
+    confusion_matrix = evaluate_confusion_matrix(labels, predictions)
     evaluate_accuracy(labels, predictions)
-    show_invalid_detections(annotations_data_frame, labels, predictions)
+    evaluate_precision_recall(confusion_matrix)
+    sweep = evaluate_threshold_sweep(labels, scores, np.linspace(0, 1, args.thresholds))
+
+    invalid_indices = np.flatnonzero(labels != predictions)[:args.max_invalid_images]
+    file_paths = annotations_data_frame['file_path'].to_numpy()[invalid_indices]
+    captions = [f'Was {SUPPORTED_CLASSES[predictions[i]]} should be {SUPPORTED_CLASSES[labels[i]]} '
+                f'({scores[i]:.2f})' for i in invalid_indices]
+
+    if args.report_directory is not None:
+        write_report(args.report_directory, labels, predictions, confusion_matrix, sweep)
+        write_contact_sheets(args.report_directory, file_paths, captions, args.workers)
+    else:
+        show_invalid_detections(file_paths, captions, args.workers)
 
 
 def evaluate_confusion_matrix(labels, predictions):
-    confusion_matrix = tf.math.confusion_matrix(labels, predictions)
+    confusion_matrix = metrics.confusion_matrix(labels, predictions, num_classes=len(SUPPORTED_CLASSES))
     print('Confusion Matrix = \n {0}'.format(confusion_matrix))
+    return confusion_matrix
 
 
 def evaluate_accuracy(labels, predictions):
-    accuracy = tf.keras.metrics.Accuracy()
-    accuracy.update_state(predictions, labels)
-    print('Accuracy = {0:.2f}'.format(accuracy.result().numpy()))
-
-
-def show_invalid_detections(annotations_data_frame, labels, predictions):
-    for index, (cat, pred) in enumerate(zip(labels, predictions)):
-        if cat != pred:
-            file_path = annotations_data_frame.iloc[index]['file_path']
-            im = cv2.imread(file_path)
-            text_localisation = (25, 25)
-            cv2.putText(im, f'Was {SUPPORTED_CLASSES[int(pred)]} should be {SUPPORTED_CLASSES[int(cat)]}',
-                        text_localisation,
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0),
-                        2,
-                        cv2.LINE_AA)
-
-            cv2.imshow('Incorrect Detection', im)
-            cv2.waitKey(0)
+    accuracy = metrics.accuracy(labels, predictions)
+    print('Accuracy = {0:.2f}'.format(accuracy))
+    return accuracy
+
+
+def evaluate_precision_recall(confusion_matrix):
+    precision, recall = metrics.precision_recall(confusion_matrix)
+    for class_name, class_precision, class_recall in zip(SUPPORTED_CLASSES, precision, recall):
+        print('{0}: precision = {1:.2f}, recall = {2:.2f}'.format(class_name, class_precision, class_recall))
+    return precision, recall
+
+
+def evaluate_threshold_sweep(labels, scores, thresholds):
+    sweep = metrics.threshold_sweep(labels, scores, thresholds)
+    best_index = int(np.argmax(sweep['accuracy']))
+    print('Best threshold = {0:.2f}, accuracy = {1:.2f}, precision = {2:.2f}, recall = {3:.2f} ({4})'.format(
+        sweep['threshold'][best_index], sweep['accuracy'][best_index], sweep['precision'][best_index],
+        sweep['recall'][best_index], SUPPORTED_CLASSES[1]))
+    return sweep
+
+
+def write_report(report_directory, labels, predictions, confusion_matrix, sweep):
+    os.makedirs(report_directory, exist_ok=True)
+    precision, recall = metrics.precision_recall(confusion_matrix)
+
+    with open(path.join(report_directory, 'metrics.json'), 'w') as metrics_file:
+        json.dump({
+            'samples': int(len(labels)),
+            'accuracy': metrics.accuracy(labels, predictions),
+            'classes': SUPPORTED_CLASSES,
+            'confusion_matrix': confusion_matrix.tolist(),
+            'precision': dict(zip(SUPPORTED_CLASSES, precision.tolist())),
+            'recall': dict(zip(SUPPORTED_CLASSES, recall.tolist()))
+        }, metrics_file, indent=2)
+
+    pd.DataFrame(sweep).to_csv(path.join(report_directory, 'threshold_sweep.csv'), index=False)
+
+
+def load_tile(file_path, caption, tile_size=CONTACT_SHEET_TILE_SIZE):
+    image = cv2.imread(file_path)
+    if image is None:
+        tile = np.full((tile_size[1], tile_size[0], 3), 64, dtype=np.uint8)
+        caption = f'Missing {path.basename(file_path)}'
+    else:
+        tile = cv2.resize(image, tile_size, interpolation=cv2.INTER_AREA)
+
+    cv2.putText(tile, caption, (5, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4, CAPTION_COLOR, 1, cv2.LINE_AA)
+    return tile
+
+
+def prefetch(function, arguments, workers):
+    # Items are processed in thread pool ahead of consumer (cv2.imread releases GIL), but only a few at a time,
+    # so large sets of images are never kept in memory at once
+    with ThreadPoolExecutor(workers) as executor:
+        futures = deque()
+        for function_arguments in arguments:
+            futures.append(executor.submit(function, *function_arguments))
+            if len(futures) > 2 * workers:
+                yield futures.popleft().result()
+
+        while futures:
+            yield futures.popleft().result()
+
+
+def write_contact_sheets(report_directory, file_paths, captions, workers, grid=CONTACT_SHEET_GRID):
+    os.makedirs(report_directory, exist_ok=True)
+    tiles_per_sheet = grid[0] * grid[1]
+    tile_w, tile_h = CONTACT_SHEET_TILE_SIZE
+    sheet = None
+
+    for i, tile in enumerate(prefetch(load_tile, zip(file_paths, captions), workers)):
+        sheet_index, tile_index = divmod(i, tiles_per_sheet)
+        if tile_index == 0:
+            sheet = np.zeros((grid[1] * tile_h, grid[0] * tile_w, 3), dtype=np.uint8)
+
+        row, column = divmod(tile_index, grid[0])
+        sheet[row * tile_h:(row + 1) * tile_h, column * tile_w:(column + 1) * tile_w] = tile
+
+        if tile_index == tiles_per_sheet - 1 or i == len(file_paths) - 1:
+            cv2.imwrite(path.join(report_directory, f'misclassified_{sheet_index:04d}.jpg'), sheet)
+
+    print('{0} misclassified images written to {1}'.format(len(file_paths), report_directory))
+
+
+def show_invalid_detections(file_paths, captions, workers=1):
+    for image, caption in zip(prefetch(cv2.imread, zip(file_paths), workers), captions):
+        if image is None:
+            continue
+
+        cv2.putText(image, caption, (25, 25), cv2.FONT_HERSHEY_SIMPLEX, 1, CAPTION_COLOR, 2, cv2.LINE_AA)
+        cv2.imshow('Incorrect Detection', image)
+        cv2.waitKey(0)
 
 
 if __name__ == '__main__':
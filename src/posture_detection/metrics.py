@@ -0,0 +1,61 @@
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+def confusion_matrix(labels, predictions, num_classes=None) -> np.ndarray:
+    labels = np.asarray(labels, dtype=np.int64)
+    predictions = np.asarray(predictions, dtype=np.int64)
+
+    if num_classes is None:
+        num_classes = int(max(labels.max(initial=-1), predictions.max(initial=-1))) + 1
+
+    return np.bincount(labels * num_classes + predictions, minlength=num_classes ** 2) \
+        .reshape(num_classes, num_classes)
+
+
+def accuracy(labels, predictions) -> float:
+    labels = np.asarray(labels)
+    predictions = np.asarray(predictions)
+    return float(np.mean(labels == predictions)) if len(labels) > 0 else 0.0
+
+
+def precision_recall(confusion_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    true_positives = np.diag(confusion_matrix).astype(np.float64)
+    predicted = confusion_matrix.sum(axis=0)
+    actual = confusion_matrix.sum(axis=1)
+
+    precision = np.divide(true_positives, predicted, out=np.zeros_like(true_positives), where=predicted > 0)
+    recall = np.divide(true_positives, actual, out=np.zeros_like(true_positives), where=actual > 0)
+    return precision, recall
+
+
+def threshold_sweep(labels, scores, thresholds) -> Dict[str, np.ndarray]:
+    # Sample is predicted as positive class (1) when its score is greater than threshold, the same as rounding in
+    # predict for threshold 0.5. All thresholds are evaluated at once on sorted scores.
+    labels = np.asarray(labels, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    order = np.argsort(scores, kind='stable')
+    sorted_scores = scores[order]
+    positives_below = np.concatenate([[0], np.cumsum(labels[order])])
+
+    negative_predictions = np.searchsorted(sorted_scores, thresholds, side='right')
+    false_negatives = positives_below[negative_predictions]
+    true_positives = positives_below[-1] - false_negatives
+    true_negatives = negative_predictions - false_negatives
+    positive_predictions = len(scores) - negative_predictions
+
+    true_positives = true_positives.astype(np.float64)
+    precision = np.divide(true_positives, positive_predictions, out=np.zeros_like(true_positives),
+                          where=positive_predictions > 0)
+    recall = true_positives / positives_below[-1] if positives_below[-1] > 0 else np.zeros_like(true_positives)
+    accuracy = (true_positives + true_negatives) / len(scores) if len(scores) > 0 else np.zeros_like(true_positives)
+
+    return {
+        'threshold': thresholds,
+        'precision': precision,
+        'recall': recall,
+        'accuracy': accuracy
+    }
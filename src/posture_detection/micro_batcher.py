@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Union, TYPE_CHECKING
+
+import numpy as np
+
+from annotations import Keypoints, KeypointsBatch, AnnotationBatch
+from posture_detection.posture_detection_model import PostureDetectionModel
+from posture_detection.stage_metrics import LatencyWindow
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_STOP = object()
+
+
+class BatchingStatistics:
+
+    def __init__(self, window_size=1000):
+        self.batch_sizes = Counter()
+        self.queueing_delays = LatencyWindow(window_size)
+
+    @property
+    def batch_count(self):
+        return sum(self.batch_sizes.values())
+
+    @property
+    def request_count(self):
+        return sum(batch_size * count for batch_size, count in self.batch_sizes.items())
+
+    @property
+    def mean_batch_size(self):
+        return self.request_count / self.batch_count if self.batch_count > 0 else 0.0
+
+    def __str__(self):
+        p50, p95, p99 = self.queueing_delays.percentiles([0.5, 0.95, 0.99])
+        return f'{self.request_count} requests in {self.batch_count} batches, ' \
+               f'mean batch size {self.mean_batch_size:.2f}, queueing delay p50 {1000 * p50:.2f} ms, ' \
+               f'p95 {1000 * p95:.2f} ms, p99 {1000 * p99:.2f} ms'
+
+
+# Collects single sample predictions from many threads and runs them as one vectorized predict call, batch is
+# closed when it reaches max_batch_size or when its oldest request waits max_wait_time seconds
+class MicroBatchingPostureDetectionModel(PostureDetectionModel):
+
+    def __init__(self, posture_detector: PostureDetectionModel, max_batch_size=64, max_wait_time=0.005):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size should be greater than 0')
+
+        if max_wait_time < 0:
+            raise ValueError('max_wait_time should not be negative')
+
+        self._posture_detector = posture_detector
+        self._max_batch_size = max_batch_size
+        self._max_wait_time = max_wait_time
+        self._requests = queue.Queue()
+        self._model_lock = threading.Lock()
+        self._closed_lock = threading.Lock()
+        self._closed = False
+        self.statistics = BatchingStatistics()
+
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    @property
+    def PREPROCESSING_PIPELINE(self):
+        return self._posture_detector.PREPROCESSING_PIPELINE
+
+    def submit(self, keypoints: Keypoints) -> Future:
+        future = Future()
+        # Requests are never queued after stop marker, where worker would not take them
+        with self._closed_lock:
+            if self._closed:
+                raise RuntimeError('Cannot submit prediction after micro-batcher is closed')
+            self._requests.put((keypoints, future, time.monotonic()))
+        return future
+
+    def close(self):
+        with self._closed_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(_STOP)
+        self._worker.join()
+
+    def preprocess(self, dataset_data_frame: Union[pd.DataFrame, KeypointsBatch, AnnotationBatch]) -> pd.DataFrame:
+        return self._posture_detector.preprocess(dataset_data_frame)
+
+    def predict(self, dataset: Union[pd.DataFrame, Keypoints, KeypointsBatch, AnnotationBatch]) -> np.ndarray:
+        if isinstance(dataset, Keypoints):
+            return np.array([self.submit(dataset).result()], dtype='int32')
+
+        # Inputs which are already batched are predicted directly
+        with self._model_lock:
+            return self._posture_detector.predict(dataset)
+
+    def predict_features(self, features: np.ndarray) -> np.ndarray:
+        with self._model_lock:
+            return self._posture_detector.predict_features(features)
+
+    def predict_scores(self, features: np.ndarray) -> np.ndarray:
+        with self._model_lock:
+            return self._posture_detector.predict_scores(features)
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is _STOP:
+                return
+
+            batch = [request]
+            deadline = request[2] + self._max_wait_time
+            stop = False
+
+            while len(batch) < self._max_batch_size:
+                try:
+                    request = self._requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+                if request is _STOP:
+                    stop = True
+                    break
+                batch.append(request)
+
+            self._predict_batch(batch)
+            if stop:
+                return
+
+    def _predict_batch(self, batch):
+        start_time = time.monotonic()
+        for _, _, submit_time in batch:
+            self.statistics.queueing_delays.add(start_time - submit_time)
+        self.statistics.batch_sizes[len(batch)] += 1
+
+        try:
+            with self._model_lock:
+                keypoints = KeypointsBatch.from_keypoints_list([keypoints for keypoints, _, _ in batch])
+                predictions = self._posture_detector.predict(keypoints)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), prediction in zip(batch, predictions):
+            future.set_result(int(prediction))
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+from typing import Union, TYPE_CHECKING
+
+import numpy as np
+
+from annotations import Keypoints, KeypointsBatch, AnnotationBatch
+from posture_detection.posture_detection_model import PostureDetectionModel
+from posture_detection.preprocessing import KEYPOINTS_PREPROCESSING_PIPELINE
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+NUMPY_WEIGHTS_FILE_NAME = 'weights.npz'
+
+ACTIVATIONS = {
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'linear': lambda x: x
+}
+
+
+class NumpyNNModel(PostureDetectionModel):
+    PREPROCESSING_PIPELINE = KEYPOINTS_PREPROCESSING_PIPELINE
+
+    def __init__(self, model_path):
+        self._model_path = model_path
+        self._weights_path = os.path.join(self._model_path, NUMPY_WEIGHTS_FILE_NAME)
+        self._layers = self._load_layers()
+
+    def preprocess(self, dataset_data_frame: Union[pd.DataFrame, KeypointsBatch, AnnotationBatch]) -> pd.DataFrame:
+        return self.PREPROCESSING_PIPELINE.run(dataset_data_frame)
+
+    def predict(self, dataset: Union[pd.DataFrame, Keypoints, KeypointsBatch, AnnotationBatch]) -> np.ndarray:
+        return self.predict_features(self.PREPROCESSING_PIPELINE.run_array(dataset))
+
+    def predict_features(self, features: np.ndarray) -> np.ndarray:
+        return np.round(self.predict_scores(np.asarray(features, dtype=np.float32))).astype('int32')
+
+    def predict_scores(self, features: np.ndarray) -> np.ndarray:
+        # Single sample is passed through layers as vector, which avoids matrix multiplication overhead
+        outputs = features[0] if len(features) == 1 else features
+        for kernel, bias, activation in self._layers:
+            outputs = activation(outputs @ kernel + bias)
+
+        return outputs.reshape(len(features))
+
+    def _load_layers(self):
+        with np.load(self._weights_path) as weights:
+            activations = weights['activations']
+            return [(weights[f'kernel_{i}'], weights[f'bias_{i}'], ACTIVATIONS[str(activation_name)])
+                    for i, activation_name in enumerate(activations)]
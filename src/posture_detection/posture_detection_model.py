@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from posture_detection.preprocessing import PreProcessingPipeline
+
+
+class PostureDetectionModel:
+    # Turns keypoints into features passed to predict_features and predict_scores, set by every model
+    PREPROCESSING_PIPELINE: PreProcessingPipeline = None
+
+    @abstractmethod
+    def preprocess(self, dataset_data_frame: pd.DataFrame) -> pd.DataFrame:
+        pass
+
+    @abstractmethod
+    def predict(self, dataset: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def predict_features(self, features: np.ndarray) -> np.ndarray:
+        pass
+
+    @abstractmethod
+    def predict_scores(self, features: np.ndarray) -> np.ndarray:
+        pass
+
+
+class TrainablePostureDetectionModel(PostureDetectionModel):
+
+    @abstractmethod
+    def train(self, train_samples, test_samples, train_labels, test_labels):
+        pass
+
+    @abstractmethod
+    def evaluate(self, dataset, labels) -> float:
+        pass
@@ -1,10 +1,15 @@
+from __future__ import annotations
+
 import math
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+import numpy as np
 
-import pandas as pd
+from annotations import Keypoints, KeypointsBatch, AnnotationBatch
 
-from annotations import Keypoints
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class PreProcessingStep(ABC):
@@ -13,6 +18,15 @@ class PreProcessingStep(ABC):
     def run(self, annotations: pd.DataFrame):
         pass
 
+    @abstractmethod
+    def run_batch(self, values: np.ndarray, column_names: List[str]) -> Tuple[np.ndarray, List[str]]:
+        pass
+
+    def describe(self) -> dict:
+        # Step type with its parameters, changes whenever step would produce different features
+        parameters = {name.lstrip('_'): value for name, value in sorted(vars(self).items())}
+        return {'step': type(self).__name__, 'parameters': parameters}
+
 
 class FilterColumns(PreProcessingStep):
 
@@ -23,6 +37,10 @@ class FilterColumns(PreProcessingStep):
         columns_to_remove = set(annotations.keys()) - set(self._column_names)
         return annotations.drop(labels=columns_to_remove)
 
+    def run_batch(self, values: np.ndarray, column_names: List[str]) -> Tuple[np.ndarray, List[str]]:
+        indices = _get_column_indices(column_names, self._column_names)
+        return values[:, indices], [column_names[index] for index in indices]
+
 
 class RemoveColumns(PreProcessingStep):
 
@@ -32,10 +50,20 @@ class RemoveColumns(PreProcessingStep):
     def run(self, annotations: pd.DataFrame):
         return annotations.drop(labels=self._column_names)
 
+    def run_batch(self, values: np.ndarray, column_names: List[str]) -> Tuple[np.ndarray, List[str]]:
+        missing_columns = set(self._column_names) - set(column_names)
+        if missing_columns:
+            raise KeyError(f'{sorted(missing_columns)} not found in columns')
+
+        indices = [index for index, column_name in enumerate(column_names) if column_name not in self._column_names]
+        return values[:, indices], [column_names[index] for index in indices]
+
 
 class NormalizePointCoordinatesToBoundingBox(PreProcessingStep):
 
     def run(self, annotations: pd.DataFrame):
+        import pandas as pd
+
         x = annotations.filter(items=Keypoints.get_point_attribute_name(coordinate='x'))
         y = annotations.filter(items=Keypoints.get_point_attribute_name(coordinate='y'))
 
@@ -49,6 +77,21 @@ class NormalizePointCoordinatesToBoundingBox(PreProcessingStep):
 
         return annotations.combine(pd.concat([x, y]), lambda x, y: x if math.isnan(y) else y)
 
+    def run_batch(self, values: np.ndarray, column_names: List[str]) -> Tuple[np.ndarray, List[str]]:
+        x_indices = _get_column_indices(column_names, Keypoints.get_point_attribute_name(coordinate='x'))
+        y_indices = _get_column_indices(column_names, Keypoints.get_point_attribute_name(coordinate='y'))
+        x = values[:, x_indices]
+        y = values[:, y_indices]
+
+        bounding_box_width = np.nanmax(x, axis=1, keepdims=True) - np.nanmin(x, axis=1, keepdims=True)
+        bounding_box_height = np.nanmax(y, axis=1, keepdims=True) - np.nanmin(y, axis=1, keepdims=True)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = (x - values[:, [column_names.index('bounding_box_lu_x')]]) / bounding_box_width
+            y = (y - values[:, [column_names.index('bounding_box_lu_y')]]) / bounding_box_height
+
+        return _combine_columns(values, column_names, x_indices + y_indices, np.hstack([x, y]))
+
 
 class PointsToVectors(PreProcessingStep):
     _available_starting_points = {
@@ -62,6 +105,8 @@ class PointsToVectors(PreProcessingStep):
         self._starting_point = self._available_starting_points[starting_point_name]
 
     def run(self, annotations: pd.DataFrame):
+        import pandas as pd
+
         x = annotations.filter(items=Keypoints.get_point_attribute_name(coordinate='x'))
         y = annotations.filter(items=Keypoints.get_point_attribute_name(coordinate='y'))
 
@@ -70,12 +115,50 @@ class PointsToVectors(PreProcessingStep):
 
         return annotations.combine(pd.concat([x, y]), lambda x, y: x if math.isnan(y) else y)
 
+    def run_batch(self, values: np.ndarray, column_names: List[str]) -> Tuple[np.ndarray, List[str]]:
+        x_indices = _get_column_indices(column_names, Keypoints.get_point_attribute_name(coordinate='x'))
+        y_indices = _get_column_indices(column_names, Keypoints.get_point_attribute_name(coordinate='y'))
+
+        x = values[:, x_indices] - self._starting_point[0]
+        y = values[:, y_indices] - self._starting_point[1]
+
+        return _combine_columns(values, column_names, x_indices + y_indices, np.hstack([x, y]))
+
 
 class PreProcessingPipeline:
     def __init__(self, steps: List[PreProcessingStep]):
         self._steps = steps
 
-    def run(self, annotations: pd.DataFrame) -> pd.DataFrame:
+    def run(self, annotations: Union[pd.DataFrame, Keypoints, KeypointsBatch, AnnotationBatch]) -> pd.DataFrame:
+        return self.run_batch(annotations)
+
+    def describe(self) -> List[dict]:
+        return [step.describe() for step in self._steps]
+
+    def run_batch(self, annotations: Union[pd.DataFrame, Keypoints, KeypointsBatch, AnnotationBatch]) -> pd.DataFrame:
+        import pandas as pd
+
+        values, column_names, index = _to_column_matrix(annotations)
+        values, column_names = self.run_values(values, column_names)
+
+        return pd.DataFrame(values, columns=column_names, index=index)
+
+    def run_array(self, annotations: Union[pd.DataFrame, Keypoints, KeypointsBatch, AnnotationBatch]) -> np.ndarray:
+        values, column_names, _ = _to_column_matrix(annotations)
+        values, _ = self.run_values(values, column_names)
+        return values
+
+    def run_values(self, values: np.ndarray, column_names: List[str]) -> Tuple[np.ndarray, List[str]]:
+        for step in self._steps:
+            values, column_names = step.run_batch(values, column_names)
+        return values, column_names
+
+    def run_rows(self, annotations: Union[pd.DataFrame, KeypointsBatch, AnnotationBatch]) -> pd.DataFrame:
+        import pandas as pd
+
+        if isinstance(annotations, (KeypointsBatch, AnnotationBatch)):
+            annotations = annotations.to_dataframe()
+
         results = []
         for row in annotations.iloc:
             for step in self._steps:
@@ -83,3 +166,49 @@ class PreProcessingPipeline:
             results.append(row)
 
         return pd.DataFrame(results)
+
+
+def _to_column_matrix(annotations: Union[pd.DataFrame, Keypoints, KeypointsBatch, AnnotationBatch]):
+    if isinstance(annotations, Keypoints):
+        values = np.concatenate([annotations.bounding_box_values, annotations.points.reshape(-1)])
+        return values.astype(np.float64).reshape(1, -1), list(Keypoints.ATTRIBUTE_NAMES), None
+
+    if isinstance(annotations, AnnotationBatch):
+        values = np.hstack([annotations.original_sizes, annotations.keypoints.bounding_boxes,
+                            annotations.keypoints.body_points])
+        column_names = ['original_size_h', 'original_size_w'] + Keypoints.ATTRIBUTE_NAMES
+        return values.astype(np.float64), column_names, None
+
+    if isinstance(annotations, KeypointsBatch):
+        values = np.hstack([annotations.bounding_boxes, annotations.body_points])
+        return values.astype(np.float64), list(Keypoints.ATTRIBUTE_NAMES), None
+
+    numeric_annotations = annotations.select_dtypes(include=np.number)
+    return numeric_annotations.to_numpy(dtype=np.float64), list(numeric_annotations.columns), annotations.index
+
+
+def _get_column_indices(column_names: List[str], selected_column_names: List[str]) -> List[int]:
+    selected_column_names = set(selected_column_names)
+    return [index for index, column_name in enumerate(column_names) if column_name in selected_column_names]
+
+
+def _combine_columns(values: np.ndarray, column_names: List[str], updated_indices: List[int],
+                     updated_values: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    # Mirrors pd.Series.combine used by the per-row steps: NaN results keep the original value
+    # and labels are aligned on the union of both indexes, which sorts them unless they are equal.
+    combined = values.copy()
+    combined[:, updated_indices] = np.where(np.isnan(updated_values), values[:, updated_indices], updated_values)
+
+    if [column_names[index] for index in updated_indices] == column_names:
+        return combined, column_names
+
+    order = sorted(range(len(column_names)), key=column_names.__getitem__)
+    return combined[:, order], [column_names[index] for index in order]
+
+
+KEYPOINTS_PREPROCESSING_PIPELINE = PreProcessingPipeline([
+    FilterColumns(Keypoints.ATTRIBUTE_NAMES),
+    NormalizePointCoordinatesToBoundingBox(),
+    FilterColumns(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES),
+    PointsToVectors(starting_point_name='center')
+])
@@ -1,90 +1,136 @@
+from __future__ import annotations
+
+import json
 import os
 import os.path as path
-from abc import abstractmethod
+from typing import Union, TYPE_CHECKING
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import tensorflow as tf
-
-from annotations import Keypoints
-from posture_detection.preprocessing import PreProcessingPipeline, NormalizePointCoordinatesToBoundingBox, \
-    FilterColumns, PointsToVectors
-
-
-class PostureDetectionModel:
-
-    @abstractmethod
-    def preprocess(self, dataset_data_frame: pd.DataFrame) -> pd.DataFrame:
-        pass
-
-    @abstractmethod
-    def train(self, train_samples, test_samples, train_labels, test_labels):
-        pass
 
-    @abstractmethod
-    def evaluate(self, dataset, labels) -> float:
-        pass
+from annotations import Keypoints, KeypointsBatch, AnnotationBatch
+from posture_detection.numpy_nn_model import NUMPY_WEIGHTS_FILE_NAME
+from posture_detection.posture_detection_model import TrainablePostureDetectionModel
+from posture_detection.preprocessing import KEYPOINTS_PREPROCESSING_PIPELINE
 
-    @abstractmethod
-    def predict(self, dataset: np.ndarray) -> np.ndarray:
-        pass
+if TYPE_CHECKING:
+    import pandas as pd
 
 
-class SimpleNNModel(PostureDetectionModel):
+class SimpleNNModel(TrainablePostureDetectionModel):
     INPUT_SIZE = len(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES)
-    PREPROCESSING_PIPELINE = PreProcessingPipeline([
-        FilterColumns(Keypoints.ATTRIBUTE_NAMES),
-        NormalizePointCoordinatesToBoundingBox(),
-        FilterColumns(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES),
-        PointsToVectors(starting_point_name='center')
-    ])
-
-    def __init__(self, model_path, load_weights=False):
-        self._model = self._create_model()
+    PREPROCESSING_PIPELINE = KEYPOINTS_PREPROCESSING_PIPELINE
+    CONFIG_FILE_NAME = 'config.json'
+
+    def __init__(self, model_path, load_weights=False, hidden_size=8, activation='sigmoid', learning_rate=0.001,
+                 patience=20):
+        self._hidden_size = hidden_size
+        self._activation = activation
+        self._learning_rate = learning_rate
+        self._patience = patience
         self._model_path = model_path
-        self._weights_path = os.path.join(self._model_path, 'weights')
+        self._weights_path = os.path.join(self._model_path, 'weights') if model_path is not None else None
+
+        # Trained model is rebuilt with hyperparameters it was trained with, models trained before
+        # config was saved use defaults
+        if load_weights:
+            self._load_config()
+        self._model = self._create_model()
 
         if load_weights:
             self._load_weights()
 
-    def preprocess(self, dataset_data_frame: pd.DataFrame) -> pd.DataFrame:
+    def preprocess(self, dataset_data_frame: Union[pd.DataFrame, KeypointsBatch, AnnotationBatch]) -> pd.DataFrame:
         return self.PREPROCESSING_PIPELINE.run(dataset_data_frame)
 
-    def train(self, train_samples, test_samples, train_labels, test_labels, epochs=5000):
-        if train_samples.shape[1] != self.INPUT_SIZE:
+    # Without labels, samples are tf.data datasets of (features, labels) batches
+    def train(self, train_samples, test_samples, train_labels=None, test_labels=None, epochs=5000):
+        if train_labels is not None and train_samples.shape[1] != self.INPUT_SIZE:
             raise ValueError(f'Invalid training set size, was {train_samples.shape[1]}, should be {self.INPUT_SIZE}')
 
-        if test_samples.shape[1] != self.INPUT_SIZE:
+        if test_labels is not None and test_samples.shape[1] != self.INPUT_SIZE:
             raise ValueError(f'Invalid test set size, was {test_samples.shape[1]}, should be {self.INPUT_SIZE}')
 
-        callback = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=20)
-        self._model.compile(optimizer='Adam', loss='binary_crossentropy', metrics=['accuracy'])
-        history = self._model.fit(train_samples, train_labels, validation_data=(test_samples, test_labels),
-                                  epochs=epochs, callbacks=[callback])
+        history = self.fit(train_samples, test_samples, train_labels, test_labels, epochs)
 
         self._model.save_weights(self._weights_path, overwrite=True)
+        self._save_config()
+        self.export_weights()
         self._show_and_save_history(history)
 
+    def fit(self, train_samples, test_samples, train_labels=None, test_labels=None, epochs=5000, verbose='auto'):
+        import tensorflow as tf
+
+        callback = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=self._patience)
+        self._model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=self._learning_rate),
+                            loss='binary_crossentropy', metrics=['accuracy'])
+        validation_data = (test_samples, test_labels) if test_labels is not None else test_samples
+        return self._model.fit(train_samples, train_labels, validation_data=validation_data, epochs=epochs,
+                               callbacks=[callback], verbose=verbose)
+
     def evaluate(self, dataset, labels):
         return self._model.evaluate(dataset, labels)
 
-    def predict(self, dataset: pd.DataFrame) -> np.ndarray:
-        dataset = self.preprocess(dataset)
-        predictions = self._model.predict(dataset)
-        return np.round(predictions).flatten().astype('int32')
+    def predict(self, dataset: Union[pd.DataFrame, Keypoints, KeypointsBatch, AnnotationBatch]) -> np.ndarray:
+        return self.predict_features(self.preprocess(dataset))
+
+    def predict_features(self, features: np.ndarray) -> np.ndarray:
+        return np.round(self.predict_scores(features)).astype('int32')
+
+    def predict_scores(self, features: np.ndarray) -> np.ndarray:
+        return self._model.predict(features).flatten()
+
+    def export_weights(self, file_path=None):
+        file_path = file_path or os.path.join(self._model_path, NUMPY_WEIGHTS_FILE_NAME)
+
+        layers_weights = {}
+        for i, layer in enumerate(self._model.layers):
+            kernel, bias = layer.get_weights()
+            layers_weights[f'kernel_{i}'] = kernel
+            layers_weights[f'bias_{i}'] = bias
+
+        activations = np.array([layer.get_config()['activation'] for layer in self._model.layers])
+        np.savez(file_path, activations=activations, **layers_weights)
 
     def _create_model(self):
+        import tensorflow as tf
+
         return tf.keras.Sequential([
-            tf.keras.layers.Input(shape=self.INPUT_SIZE),
-            tf.keras.layers.Dense(8, activation='sigmoid'),
+            tf.keras.layers.Input(shape=(self.INPUT_SIZE,)),
+            tf.keras.layers.Dense(self._hidden_size, activation=self._activation),
             tf.keras.layers.Dense(1, activation='sigmoid')
         ])
 
+    def get_config(self) -> dict:
+        return {
+            'hidden_size': self._hidden_size,
+            'activation': self._activation,
+            'learning_rate': self._learning_rate,
+            'patience': self._patience
+        }
+
+    def _save_config(self):
+        with open(os.path.join(self._model_path, self.CONFIG_FILE_NAME), 'w') as config_file:
+            json.dump(self.get_config(), config_file, indent=2)
+
+    def _load_config(self):
+        config_path = os.path.join(self._model_path, self.CONFIG_FILE_NAME)
+        if not os.path.exists(config_path):
+            return
+
+        with open(config_path) as config_file:
+            config = json.load(config_file)
+
+        self._hidden_size = config.get('hidden_size', self._hidden_size)
+        self._activation = config.get('activation', self._activation)
+        self._learning_rate = config.get('learning_rate', self._learning_rate)
+        self._patience = config.get('patience', self._patience)
+
     def _load_weights(self):
         self._model.load_weights(self._weights_path)
 
     def _show_and_save_history(self, history):
+        import matplotlib.pyplot as plt
+
         plt.plot(history.history['loss'], label='loss')
         plt.plot(history.history['val_loss'], label='val loss')
         plt.legend()
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+METRICS_PREFIX = 'postureguard'
+PROMETHEUS_EXTENSIONS = ['.prom', '.txt']
+
+
+class LatencyWindow:
+
+    def __init__(self, window_size=1000):
+        self._latencies = deque(maxlen=window_size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, latency):
+        self._latencies.append(latency)
+        self.count += 1
+        self.total += latency
+
+    def percentiles(self, quantiles):
+        if len(self._latencies) == 0:
+            return [0.0 for _ in quantiles]
+        return np.percentile(np.fromiter(self._latencies, dtype=np.float64), [100 * q for q in quantiles]).tolist()
+
+
+class _StageTimer:
+
+    def __init__(self, stage_metrics, stage):
+        self._stage_metrics = stage_metrics
+        self._stage = stage
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stage_metrics.record(self._stage, time.monotonic() - self._start_time)
+
+
+class _NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class StageMetrics:
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, export_file_path=None, export_interval=10.0, window_size=1000, export_format=None):
+        if export_format is None and export_file_path is not None:
+            extension = os.path.splitext(export_file_path)[-1].lower()
+            export_format = 'prometheus' if extension in PROMETHEUS_EXTENSIONS else 'jsonl'
+
+        if export_format not in [None, 'jsonl', 'prometheus']:
+            raise ValueError(f'metrics export format = {export_format} not supported')
+
+        self._export_file_path = export_file_path
+        self._export_format = export_format
+        self._export_interval = export_interval
+        self._window_size = window_size
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._next_export_time = time.monotonic() + export_interval
+
+    @property
+    def enabled(self):
+        return True
+
+    def measure(self, stage):
+        return _StageTimer(self, stage)
+
+    def record(self, stage, latency):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = LatencyWindow(self._window_size)
+            self._stages[stage].add(latency)
+
+        self.maybe_export()
+
+    def count(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def maybe_export(self):
+        if self._export_file_path is None:
+            return
+
+        # Checked and updated under lock, so only one of the threads recording latencies exports
+        with self._lock:
+            if time.monotonic() < self._next_export_time:
+                return
+            self._next_export_time = time.monotonic() + self._export_interval
+
+        self.export()
+
+    def summary(self):
+        with self._lock:
+            stages = {}
+            for stage, latencies in self._stages.items():
+                stages[stage] = {'count': latencies.count, 'mean': latencies.total / latencies.count}
+                for quantile, value in zip(self.QUANTILES, latencies.percentiles(self.QUANTILES)):
+                    stages[stage][f'p{int(100 * quantile)}'] = value
+
+            return {'timestamp': time.time(), 'counters': dict(self._counters), 'stages': stages}
+
+    def export(self):
+        if self._export_file_path is None:
+            return
+
+        summary = self.summary()
+        # Periodic export and export on close can run on different threads and share temporary file
+        with self._export_lock:
+            if self._export_format == 'prometheus':
+                # File is replaced atomically, so scraper never reads partially written metrics
+                temporary_file_path = self._export_file_path + '.tmp'
+                with open(temporary_file_path, 'w') as metrics_file:
+                    metrics_file.write(_to_prometheus_text(summary, self.QUANTILES))
+                os.replace(temporary_file_path, self._export_file_path)
+            else:
+                with open(self._export_file_path, 'a') as metrics_file:
+                    metrics_file.write(json.dumps(summary) + '\n')
+
+    def close(self):
+        self.export()
+
+    def __str__(self):
+        summary = self.summary()
+        lines = [f'{stage}: {values["count"]} calls, ' +
+                 ', '.join(f'{name} {1000 * values[name]:.2f} ms' for name in ['mean', 'p50', 'p95', 'p99'])
+                 for stage, values in summary['stages'].items()]
+        lines += [f'{counter}: {value}' for counter, value in summary['counters'].items()]
+        return '\n'.join(lines)
+
+
+# Used when instrumentation is disabled, every call is no-op so instrumented code doesn't need to check it
+class DisabledStageMetrics(StageMetrics):
+    _NULL_TIMER = _NullTimer()
+
+    @property
+    def enabled(self):
+        return False
+
+    def measure(self, stage):
+        return self._NULL_TIMER
+
+    def record(self, stage, latency):
+        pass
+
+    def count(self, counter, value=1):
+        pass
+
+    def maybe_export(self):
+        pass
+
+    def export(self):
+        pass
+
+
+DISABLED_STAGE_METRICS = DisabledStageMetrics()
+
+
+def _to_prometheus_text(summary, quantiles):
+    latency_metric = f'{METRICS_PREFIX}_stage_latency_seconds'
+    lines = [f'# HELP {latency_metric} Latency of video processing stage.',
+             f'# TYPE {latency_metric} summary']
+    for stage, values in summary['stages'].items():
+        for quantile in quantiles:
+            lines.append(f'{latency_metric}{{stage="{stage}",quantile="{quantile}"}} '
+                         f'{values[f"p{int(100 * quantile)}"]}')
+        lines.append(f'{latency_metric}_sum{{stage="{stage}"}} {values["mean"] * values["count"]}')
+        lines.append(f'{latency_metric}_count{{stage="{stage}"}} {values["count"]}')
+
+    frames_metric = f'{METRICS_PREFIX}_frames_total'
+    lines += [f'# HELP {frames_metric} Number of video frames by processing state.',
+              f'# TYPE {frames_metric} counter']
+    lines += [f'{frames_metric}{{state="{counter}"}} {value}' for counter, value in summary['counters'].items()]
+    return '\n'.join(lines) + '\n'
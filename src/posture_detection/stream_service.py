@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import os
+import os.path as path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import cv2
+
+from keypoints_detection.KeypointDetector import KeypointDetector
+from keypoints_detection.factory import create_keypoint_detector
+from posture_detection.demo import detect_postures_with_confidence
+from posture_detection.factory import create_posture_detection_model
+from posture_detection.frame_results import FrameResultsWriter
+from posture_detection.frame_scheduler import DEFAULT_VIDEO_FPS
+from posture_detection.posture_detection_model import PostureDetectionModel
+from posture_detection.stage_metrics import StageMetrics, DISABLED_STAGE_METRICS
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Runs posture detection on many video streams at once, sharing single "
+                                             "keypoint detector and posture detection model between them")
+    ap.add_argument("-i", "--video_sources", required=True, nargs='+',
+                    help="Paths to video files or stream URLs, e.g. rtsp://camera/stream")
+    ap.add_argument("-p", "--posture_detector_model_path", required=True,
+                    help="Path to trained model")
+    ap.add_argument("-k", "--keypoint_detector_model_path", required=True,
+                    help="Path to keypoint detection model")
+    ap.add_argument("-e", "--inference_engine", required=False, default='auto', choices=['auto', 'numpy', 'keras'],
+                    help="Posture detection inference engine")
+    ap.add_argument("-b", "--batch_size", required=False, type=int, default=None,
+                    help="Maximum number of frames passed to keypoint detector at once, defaults to number of "
+                         "streams")
+    ap.add_argument("--buffer_size", required=False, type=int, default=2,
+                    help="Number of decoded frames buffered for each stream. For live streams oldest frame is "
+                         "dropped when buffer is full, video files wait for free space")
+    ap.add_argument("-o", "--output_directory", required=False, default='.',
+                    help="Directory where per stream results are written as <index>_<stream_name>_postures.csv.gz")
+    ap.add_argument("--metrics_file_path", required=False, default=None,
+                    help="Enables per stage latency metrics, exported periodically to given file")
+    return ap.parse_args()
+
+
+class VideoStream:
+
+    def __init__(self, stream_id, source, buffer_size=2, drop_stale_frames=None):
+        self.stream_id = stream_id
+        self.source = source
+        self.fps = DEFAULT_VIDEO_FPS
+        self.finished = False
+        self.processed_count = 0
+        self.dropped_count = 0
+        self._buffer_size = buffer_size
+        # Frames of live streams which can't be processed in time are dropped, video files are processed entirely
+        self._drop_stale_frames = '://' in source if drop_stale_frames is None else drop_stale_frames
+        self._frames = None
+
+    @property
+    def name(self):
+        return path.splitext(path.basename(self.source.rstrip('/')))[0] or f'stream_{self.stream_id}'
+
+    def has_frames(self):
+        return self._frames is not None and not self._frames.empty()
+
+    def get_frame(self):
+        return self._frames.get_nowait()
+
+    async def read(self, executor: ThreadPoolExecutor, frame_available: asyncio.Event):
+        loop = asyncio.get_running_loop()
+        self._frames = asyncio.Queue(maxsize=self._buffer_size)
+
+        capture = await loop.run_in_executor(executor, cv2.VideoCapture, self.source)
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or DEFAULT_VIDEO_FPS
+        frame_num = 0
+
+        try:
+            while True:
+                ret, frame = await loop.run_in_executor(executor, capture.read)
+                if not ret or frame is None:
+                    break
+
+                await self._put((frame_num, frame))
+                frame_available.set()
+                frame_num += 1
+        finally:
+            capture.release()
+            self.finished = True
+            frame_available.set()
+
+    async def _put(self, item):
+        if not self._drop_stale_frames:
+            await self._frames.put(item)
+            return
+
+        if self._frames.full():
+            self._frames.get_nowait()
+            self.dropped_count += 1
+        self._frames.put_nowait(item)
+
+
+class FairFrameScheduler:
+
+    def __init__(self, streams: List[VideoStream], batch_size):
+        self._streams = streams
+        self._batch_size = batch_size
+        self._next_stream_index = 0
+        self.frame_available = asyncio.Event()
+
+    async def next_batch(self):
+        while True:
+            batch = self._take_frames()
+            if len(batch) > 0 or all(stream.finished and not stream.has_frames() for stream in self._streams):
+                return batch
+
+            self.frame_available.clear()
+            await self.frame_available.wait()
+
+    def _take_frames(self):
+        # Round robin, one frame from every stream per round, so busy streams can't starve other ones
+        batch = []
+        while len(batch) < self._batch_size:
+            taken_frames = 0
+            for i in range(len(self._streams)):
+                if len(batch) == self._batch_size:
+                    break
+
+                stream_index = (self._next_stream_index + i) % len(self._streams)
+                stream = self._streams[stream_index]
+                if stream.has_frames():
+                    frame_num, frame = stream.get_frame()
+                    batch.append((stream, frame_num, frame))
+                    taken_frames += 1
+                    self._next_stream_index = (stream_index + 1) % len(self._streams)
+
+            if taken_frames == 0:
+                break
+
+        return batch
+
+
+class PostureDetectionService:
+
+    def __init__(self, keypoint_detector: KeypointDetector, posture_detector: PostureDetectionModel, batch_size=None,
+                 metrics: StageMetrics = DISABLED_STAGE_METRICS):
+        self._keypoint_detector = keypoint_detector
+        self._posture_detector = posture_detector
+        self._batch_size = batch_size
+        self._metrics = metrics
+
+    async def run(self, streams: List[VideoStream], publish: Callable):
+        scheduler = FairFrameScheduler(streams, self._batch_size or len(streams))
+        loop = asyncio.get_running_loop()
+
+        # Models are shared by all streams and are not thread safe, so inference runs on single thread
+        with ThreadPoolExecutor(len(streams), thread_name_prefix='decode') as decode_executor, \
+                ThreadPoolExecutor(1, thread_name_prefix='inference') as inference_executor:
+            readers = [asyncio.ensure_future(stream.read(decode_executor, scheduler.frame_available))
+                       for stream in streams]
+
+            try:
+                while True:
+                    batch = await scheduler.next_batch()
+                    if len(batch) == 0:
+                        break
+
+                    frames = [frame for _, _, frame in batch]
+                    results = await loop.run_in_executor(inference_executor, detect_postures_with_confidence,
+                                                         frames, self._keypoint_detector, self._posture_detector,
+                                                         self._metrics)
+
+                    for (stream, frame_num, _), result in zip(batch, results):
+                        stream.processed_count += 1
+                        publish(stream, frame_num, result)
+            finally:
+                for reader in readers:
+                    reader.cancel()
+                await asyncio.gather(*readers, return_exceptions=True)
+
+
+def main(args):
+    for video_source in args.video_sources:
+        if '://' not in video_source and not path.exists(video_source):
+            print("File {0} doesn't exist".format(video_source))
+            return
+
+    keypoint_detector = create_keypoint_detector(args.keypoint_detector_model_path)
+    posture_detector = create_posture_detection_model(args.posture_detector_model_path, args.inference_engine)
+    metrics = StageMetrics(args.metrics_file_path) if args.metrics_file_path is not None else DISABLED_STAGE_METRICS
+
+    streams = [VideoStream(stream_id, video_source, args.buffer_size)
+               for stream_id, video_source in enumerate(args.video_sources)]
+    os.makedirs(args.output_directory, exist_ok=True)
+    results_writers = {stream.stream_id: FrameResultsWriter(
+        path.join(args.output_directory, f'{stream.stream_id}_{stream.name}_postures.csv.gz')) for stream in streams}
+
+    def publish(stream: VideoStream, frame_num, result):
+        results_writers[stream.stream_id].write(frame_num, frame_num / stream.fps, result)
+
+    service = PostureDetectionService(keypoint_detector, posture_detector, args.batch_size, metrics)
+    try:
+        asyncio.run(service.run(streams, publish))
+    finally:
+        for results_writer in results_writers.values():
+            results_writer.close()
+
+    for stream in streams:
+        print(f'{stream.source}: {stream.processed_count} frames processed, {stream.dropped_count} dropped')
+
+    if metrics.enabled:
+        metrics.close()
+        print(metrics)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
@@ -0,0 +1,54 @@
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from annotation_storage import read_annotations_in_chunks
+from annotations import SUPPORTED_CLASSES, Keypoints
+from posture_detection.preprocessing import PreProcessingPipeline
+
+SPLIT_RESOLUTION = 10000
+SPLIT_KEY_COLUMN = 'file_path'
+
+
+def is_test_sample(split_keys: pd.Series, test_size) -> np.ndarray:
+    # Split depends only on hash of the key, so it doesn't change between runs, chunk sizes or when data is appended.
+    # Keys are image paths, so all persons detected in one image end up in the same subset.
+    hashes = pd.util.hash_pandas_object(split_keys, index=False).to_numpy()
+    return hashes % SPLIT_RESOLUTION < int(round(test_size * SPLIT_RESOLUTION))
+
+
+def iterate_preprocessed_chunks(annotations_file_path, pipeline: PreProcessingPipeline, chunk_size, test_size,
+                                subset) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    columns = Keypoints.ATTRIBUTE_NAMES + ['class', SPLIT_KEY_COLUMN]
+    for chunk in read_annotations_in_chunks(annotations_file_path, chunk_size, columns=columns):
+        test_samples = is_test_sample(chunk[SPLIT_KEY_COLUMN], test_size)
+        chunk = chunk[test_samples if subset == 'test' else ~test_samples]
+        if len(chunk) == 0:
+            continue
+
+        labels = pd.Categorical(chunk['class'], categories=SUPPORTED_CLASSES).codes.astype(np.int32)
+        features = pipeline.run_array(chunk.drop(columns=[SPLIT_KEY_COLUMN])).astype(np.float32)
+        yield features, labels
+
+
+# Annotations are read and preprocessed chunk by chunk every epoch, so peak memory is bounded by chunk size,
+# shuffle buffer and prefetched batches, regardless of dataset size
+def create_streaming_dataset(annotations_file_path, pipeline: PreProcessingPipeline, subset, test_size=0.2,
+                             chunk_size=10000, shuffle_buffer_size=10000, batch_size=32, seed=0):
+    import tensorflow as tf
+
+    if subset not in ('train', 'test'):
+        raise ValueError(f'subset = {subset} not allowed, should be train or test')
+
+    input_size = len(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES)
+    dataset = tf.data.Dataset.from_generator(
+        lambda: iterate_preprocessed_chunks(annotations_file_path, pipeline, chunk_size, test_size, subset),
+        output_signature=(tf.TensorSpec(shape=(None, input_size), dtype=tf.float32),
+                          tf.TensorSpec(shape=(None,), dtype=tf.int32)))
+    dataset = dataset.unbatch()
+
+    if subset == 'train' and shuffle_buffer_size > 1:
+        dataset = dataset.shuffle(shuffle_buffer_size, seed=seed, reshuffle_each_iteration=True)
+
+    return dataset.batch(batch_size).prefetch(2)
@@ -5,18 +5,44 @@ import os.path as path
 import pandas as pd
 from sklearn.model_selection import train_test_split
 
-from annotations import SUPPORTED_CLASSES
+from annotation_storage import read_annotations
+from annotations import SUPPORTED_CLASSES, Keypoints
+from posture_detection.feature_cache import FeatureCache, get_feature_cache_key
+from posture_detection.preprocessing import PreProcessingPipeline
 from posture_detection.simple_nn_model import SimpleNNModel
+from posture_detection.streaming_dataset import create_streaming_dataset
 
 MODELS_DIRECTORY = './models'
+FEATURE_CACHE_DIRECTORY = './feature_cache'
 
 
 def parse_args():
     ap = argparse.ArgumentParser(description="")
     ap.add_argument("-i", "--annotations_file_path", required=True,
-                    help="Path to annotations in csv format")
+                    help="Path to annotations file (.csv, .npann or .parquet)")
     ap.add_argument("-m", "--model_name", required=False,
                     help="Model name", default='default_model')
+    ap.add_argument("--hidden_size", required=False, type=int, default=8,
+                    help="Size of hidden layer")
+    ap.add_argument("--activation", required=False, default='sigmoid', choices=['sigmoid', 'relu', 'tanh'],
+                    help="Activation of hidden layer")
+    ap.add_argument("--learning_rate", required=False, type=float, default=0.001,
+                    help="Learning rate of Adam optimizer")
+    ap.add_argument("--patience", required=False, type=int, default=20,
+                    help="Early stopping patience in epochs")
+    ap.add_argument("-c", "--feature_cache_directory", required=False, default=FEATURE_CACHE_DIRECTORY,
+                    help="Directory where preprocessed features are cached between runs, empty string disables cache")
+    ap.add_argument("--rebuild_feature_cache", required=False, action='store_true',
+                    help="Preprocesses annotations again even if cached features are available")
+    ap.add_argument("-s", "--streaming", required=False, action='store_true',
+                    help="Reads and preprocesses annotations in chunks every epoch instead of loading them at once, "
+                         "for datasets which don't fit in memory. Test set is chosen by hash of image path")
+    ap.add_argument("--chunk_size", required=False, type=int, default=10000,
+                    help="Number of annotations read at once in streaming mode")
+    ap.add_argument("--shuffle_buffer_size", required=False, type=int, default=10000,
+                    help="Number of samples shuffled together in streaming mode")
+    ap.add_argument("--batch_size", required=False, type=int, default=32,
+                    help="Training batch size in streaming mode")
     return ap.parse_args()
 
 
@@ -29,19 +55,60 @@ def main(args):
     if not path.exists(model_path):
         os.mkdir(model_path)
 
-    model = SimpleNNModel(model_path)
-    X_train, X_test, Y_train, Y_test = prepare_dataset(model.preprocess, args.annotations_file_path)
+    model = SimpleNNModel(model_path, hidden_size=args.hidden_size, activation=args.activation,
+                          learning_rate=args.learning_rate, patience=args.patience)
+    if args.streaming:
+        X_train, X_test = prepare_streaming_dataset(model.PREPROCESSING_PIPELINE, args.annotations_file_path,
+                                                    args.chunk_size, args.shuffle_buffer_size, args.batch_size)
+        Y_train, Y_test = None, None
+    else:
+        feature_cache = FeatureCache(args.feature_cache_directory) if args.feature_cache_directory else None
+        X_train, X_test, Y_train, Y_test = prepare_dataset(model.PREPROCESSING_PIPELINE, args.annotations_file_path,
+                                                           feature_cache, args.rebuild_feature_cache)
     model.train(X_train, X_test, Y_train, Y_test)
 
     print('Train accuracy = ', model.evaluate(X_train, Y_train))
     print('Test accuracy = ', model.evaluate(X_test, Y_test))
 
 
-def prepare_dataset(preprocessing_function, annotations_file_path):
-    annotations_data_frame = pd.read_csv(annotations_file_path)
-    categories = pd.Categorical(annotations_data_frame['class'], categories=SUPPORTED_CLASSES).codes
-    preprocessed_dataset = preprocessing_function(annotations_data_frame)
-    return train_test_split(preprocessed_dataset, categories, train_size=0.8)
+def prepare_dataset(pipeline: PreProcessingPipeline, annotations_file_path, feature_cache: FeatureCache = None,
+                    rebuild_feature_cache=False):
+    features, labels = load_features_and_labels(pipeline, annotations_file_path, feature_cache, rebuild_feature_cache)
+    return train_test_split(features, labels, train_size=0.8)
+
+
+def prepare_streaming_dataset(pipeline: PreProcessingPipeline, annotations_file_path, chunk_size=10000,
+                              shuffle_buffer_size=10000, batch_size=32, test_size=0.2):
+    return tuple(create_streaming_dataset(annotations_file_path, pipeline, subset, test_size, chunk_size,
+                                          shuffle_buffer_size, batch_size) for subset in ('train', 'test'))
+
+
+def load_features_and_labels(pipeline: PreProcessingPipeline, annotations_file_path,
+                             feature_cache: FeatureCache = None, rebuild_feature_cache=False):
+    if feature_cache is None:
+        return preprocess_annotations(pipeline, annotations_file_path)
+
+    key = get_feature_cache_key(annotations_file_path, pipeline, SUPPORTED_CLASSES)
+    if not rebuild_feature_cache:
+        cached = feature_cache.get(key)
+        if cached is not None:
+            print('Preprocessed features loaded from {0}'.format(feature_cache.get_entry_path(key)))
+            return cached
+
+    features, labels = preprocess_annotations(pipeline, annotations_file_path)
+    feature_cache.put(key, features, labels, metadata={
+        'annotations_file_path': path.abspath(annotations_file_path),
+        'pipeline': pipeline.describe(),
+        'classes': SUPPORTED_CLASSES
+    })
+    return features, labels
+
+
+def preprocess_annotations(pipeline: PreProcessingPipeline, annotations_file_path):
+    annotations_data_frame = read_annotations(annotations_file_path, columns=Keypoints.ATTRIBUTE_NAMES + ['class'])
+    labels = pd.Categorical(annotations_data_frame['class'], categories=SUPPORTED_CLASSES).codes
+    features = pipeline.run_array(annotations_data_frame)
+    return features, labels
 
 
 if __name__ == '__main__':
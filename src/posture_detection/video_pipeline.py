@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from posture_detection.stage_metrics import StageMetrics, DISABLED_STAGE_METRICS
+
+END_OF_STREAM = object()
+
+
+class VideoFrame:
+
+    def __init__(self, frame_num, image):
+        self.frame_num = frame_num
+        self.image = image
+        self.keypoints = []
+        self.class_names = []
+
+
+class StageStatistics:
+
+    def __init__(self, name):
+        self.name = name
+        self.processed_count = 0
+        self.dropped_count = 0
+        self.busy_time = 0.0
+        self._start_time = None
+        self._end_time = None
+
+    def start(self):
+        self._start_time = time.monotonic()
+
+    def stop(self):
+        self._end_time = time.monotonic()
+
+    def update(self, busy_time):
+        self.processed_count += 1
+        self.busy_time += busy_time
+
+    @property
+    def elapsed_time(self):
+        if self._start_time is None:
+            return 0.0
+        return (self._end_time or time.monotonic()) - self._start_time
+
+    @property
+    def throughput(self):
+        return self.processed_count / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def __str__(self):
+        busy_time_per_frame = 1000 * self.busy_time / self.processed_count if self.processed_count else 0.0
+        return f'{self.name}: {self.processed_count} frames, {self.throughput:.2f} fps, ' \
+               f'{busy_time_per_frame:.2f} ms/frame, {self.dropped_count} dropped'
+
+
+class FrameSourceStage(threading.Thread):
+
+    def __init__(self, capture, output_queue: queue.Queue, drop_stale_frames=True,
+                 metrics: StageMetrics = DISABLED_STAGE_METRICS):
+        super().__init__(name='decode', daemon=True)
+        self.statistics = StageStatistics('decode')
+        self._metrics = metrics
+        self._capture = capture
+        self._output_queue = output_queue
+        self._drop_stale_frames = drop_stale_frames
+        self._stop_event = threading.Event()
+        self.exception = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        self.statistics.start()
+        frame_num = 0
+
+        # End of stream is always forwarded, so pipeline doesn't wait forever when decoding fails
+        try:
+            while not self._stop_event.is_set():
+                start_time = time.monotonic()
+                ret, image = self._capture.read()
+                if not ret or image is None:
+                    break
+
+                frame_num += 1
+                self.statistics.update(time.monotonic() - start_time)
+                self._metrics.record('decode', time.monotonic() - start_time)
+                self._put(VideoFrame(frame_num, image))
+        except Exception as e:
+            self.exception = e
+        finally:
+            self._output_queue.put(END_OF_STREAM)
+            self.statistics.stop()
+
+    def _put(self, video_frame):
+        if not self._drop_stale_frames:
+            self._output_queue.put(video_frame)
+            return
+
+        # Oldest frame is discarded instead of blocking, so latency stays bounded by queue size
+        while True:
+            try:
+                self._output_queue.put_nowait(video_frame)
+                return
+            except queue.Full:
+                try:
+                    self._output_queue.get_nowait()
+                    self.statistics.dropped_count += 1
+                    self._metrics.count('dropped')
+                except queue.Empty:
+                    pass
+
+
+class ProcessingStage(threading.Thread):
+
+    def __init__(self, name, function: Callable[[VideoFrame], VideoFrame], input_queue: queue.Queue,
+                 output_queue: queue.Queue, metrics: StageMetrics = DISABLED_STAGE_METRICS):
+        super().__init__(name=name, daemon=True)
+        self.statistics = StageStatistics(name)
+        self._metrics = metrics
+        self._function = function
+        self._input_queue = input_queue
+        self._output_queue = output_queue
+        self.exception = None
+
+    def run(self):
+        self.statistics.start()
+
+        try:
+            while True:
+                video_frame = self._input_queue.get()
+                if video_frame is END_OF_STREAM:
+                    return
+
+                start_time = time.monotonic()
+                video_frame = self._function(video_frame)
+                self.statistics.update(time.monotonic() - start_time)
+                self._metrics.record(self.statistics.name, time.monotonic() - start_time)
+                self._output_queue.put(video_frame)
+        except Exception as e:
+            self.exception = e
+        finally:
+            self._output_queue.put(END_OF_STREAM)
+            self.statistics.stop()
+
+        # Failed stage keeps consuming its input, so previous stages are not blocked on full queue
+        while self._input_queue.get() is not END_OF_STREAM:
+            pass
+
+
+class VideoPipeline:
+
+    def __init__(self, capture, stages: List[Tuple[str, Callable[[VideoFrame], VideoFrame]]],
+                 output_function: Callable[[VideoFrame], bool], queue_size=2,
+                 metrics: StageMetrics = DISABLED_STAGE_METRICS):
+        queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+        self._source = FrameSourceStage(capture, queues[0], metrics=metrics)
+        self._stages = [ProcessingStage(name, function, queues[i], queues[i + 1], metrics)
+                        for i, (name, function) in enumerate(stages)]
+        self._metrics = metrics
+        self._output_queue = queues[-1]
+        self._output_function = output_function
+        self._output_statistics = StageStatistics('output')
+
+    @property
+    def statistics(self) -> List[StageStatistics]:
+        return [self._source.statistics] + [stage.statistics for stage in self._stages] + [self._output_statistics]
+
+    def run(self):
+        for stage in [self._source] + self._stages:
+            stage.start()
+
+        # Output runs on the calling thread because GUI functions are not thread safe
+        self._output_statistics.start()
+        while True:
+            video_frame = self._output_queue.get()
+            if video_frame is END_OF_STREAM:
+                break
+
+            start_time = time.monotonic()
+            should_continue = self._output_function(video_frame)
+            self._output_statistics.update(time.monotonic() - start_time)
+            self._metrics.record('output', time.monotonic() - start_time)
+            self._metrics.count('processed')
+
+            if should_continue is False:
+                self._source.stop()
+                self._drain_output_queue()
+                break
+
+        self._output_statistics.stop()
+
+        for stage in [self._source] + self._stages:
+            if stage.exception is not None:
+                self._source.stop()
+                raise stage.exception
+
+        return self.statistics
+
+    def _drain_output_queue(self):
+        while self._output_queue.get() is not END_OF_STREAM:
+            pass
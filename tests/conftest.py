@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Sources are namespace packages under src, imported the same way as when tools are run from src directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
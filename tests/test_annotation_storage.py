@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from annotations import AnnotationBatch
+from annotation_storage import NumpyAnnotationStorage, read_annotations, read_annotations_in_chunks, \
+    write_annotations
+from benchmarks.micro_benchmarks import generate_annotations
+
+
+def create_annotations_data_frame(count, seed=0) -> pd.DataFrame:
+    annotations = generate_annotations(np.random.RandomState(seed), count)
+    return AnnotationBatch.from_annotations_list(annotations).to_dataframe()
+
+
+def read_chunks(file_path, chunk_size, columns=None, start=0) -> pd.DataFrame:
+    chunks = list(read_annotations_in_chunks(file_path, chunk_size, columns, start))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    return pd.concat(chunks, ignore_index=True)
+
+
+@pytest.fixture(params=['annotations.csv', 'annotations.npann'])
+def annotations_file_path(request, tmp_path):
+    annotations_file_path = str(tmp_path / request.param)
+    write_annotations(create_annotations_data_frame(23), annotations_file_path)
+    return annotations_file_path
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 23, 100])
+def test_chunks_reassemble_to_read(annotations_file_path, chunk_size):
+    expected = read_annotations(annotations_file_path)
+    pd.testing.assert_frame_equal(read_chunks(annotations_file_path, chunk_size), expected)
+
+
+@pytest.mark.parametrize('start', [0, 1, 7, 22, 23, 30])
+def test_chunks_start_at_offset(annotations_file_path, start):
+    columns = ['file_path', 'class', 'nose_x', 'confidence']
+    expected = read_annotations(annotations_file_path, columns).iloc[start:].reset_index(drop=True)
+
+    if len(expected) == 0:
+        assert sum(len(chunk) for chunk in read_annotations_in_chunks(annotations_file_path, 5, columns, start)) == 0
+    else:
+        pd.testing.assert_frame_equal(read_chunks(annotations_file_path, 5, columns, start), expected)
+
+
+def test_old_npann_format_is_read(tmp_path):
+    annotations_file_path = str(tmp_path / 'annotations.npann')
+    data_frame = create_annotations_data_frame(12)
+    write_annotations(data_frame, annotations_file_path)
+
+    # Earlier versions kept text columns as lists in metadata instead of separate files
+    metadata_file_path = os.path.join(annotations_file_path, NumpyAnnotationStorage.METADATA_FILE_NAME)
+    with open(metadata_file_path) as metadata_file:
+        metadata = json.load(metadata_file)
+    metadata['text_columns'] = {}
+    for column, text_column_file_name in metadata.pop('text_column_files').items():
+        text_column_file_path = os.path.join(annotations_file_path, text_column_file_name)
+        metadata['text_columns'][column] = np.load(text_column_file_path).tolist()
+        os.remove(text_column_file_path)
+    with open(metadata_file_path, 'w') as metadata_file:
+        json.dump(metadata, metadata_file)
+
+    pd.testing.assert_frame_equal(read_annotations(annotations_file_path), data_frame)
+    pd.testing.assert_frame_equal(read_chunks(annotations_file_path, 5, start=3),
+                                  data_frame.iloc[3:].reset_index(drop=True))
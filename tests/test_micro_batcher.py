@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from benchmarks.micro_benchmarks import generate_keypoints
+from posture_detection.micro_batcher import MicroBatchingPostureDetectionModel
+from posture_detection.posture_detection_model import PostureDetectionModel
+
+
+class ConfidenceThresholdModel(PostureDetectionModel):
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def preprocess(self, dataset_data_frame):
+        return dataset_data_frame
+
+    def predict(self, dataset):
+        self.batch_sizes.append(len(dataset))
+        return (dataset.bounding_boxes[:, 4] > 0.65).astype('int32')
+
+    def predict_features(self, features):
+        return np.round(self.predict_scores(features)).astype('int32')
+
+    def predict_scores(self, features):
+        return np.zeros(len(features))
+
+
+def test_concurrent_submits_are_batched():
+    model = ConfidenceThresholdModel()
+    keypoints = generate_keypoints(np.random.RandomState(0), 8)
+    micro_batcher = MicroBatchingPostureDetectionModel(model, max_batch_size=8, max_wait_time=10)
+    barrier = threading.Barrier(len(keypoints))
+
+    def submit(person_keypoints):
+        barrier.wait()
+        return micro_batcher.submit(person_keypoints).result(timeout=5)
+
+    # Batch is closed when it is full, long before max_wait_time
+    with ThreadPoolExecutor(len(keypoints)) as executor:
+        predictions = list(executor.map(submit, keypoints))
+    micro_batcher.close()
+
+    assert model.batch_sizes == [8]
+    assert predictions == [int(k.bounding_box_values[4] > 0.65) for k in keypoints]
+    assert micro_batcher.statistics.request_count == 8
+
+
+def test_batch_is_closed_after_max_wait_time():
+    model = ConfidenceThresholdModel()
+    micro_batcher = MicroBatchingPostureDetectionModel(model, max_batch_size=8, max_wait_time=0.01)
+
+    for person_keypoints in generate_keypoints(np.random.RandomState(1), 3):
+        micro_batcher.predict(person_keypoints)
+    micro_batcher.close()
+
+    assert model.batch_sizes == [1, 1, 1]
+
+
+def test_submit_after_close_raises():
+    micro_batcher = MicroBatchingPostureDetectionModel(ConfidenceThresholdModel())
+    micro_batcher.close()
+    micro_batcher.close()
+
+    with pytest.raises(RuntimeError):
+        micro_batcher.submit(generate_keypoints(np.random.RandomState(2), 1)[0])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from annotations import KeypointsBatch
+from benchmarks.micro_benchmarks import generate_keypoints
+
+pytest.importorskip('tensorflow')
+
+from posture_detection.numpy_nn_model import NumpyNNModel  # noqa: E402
+from posture_detection.simple_nn_model import SimpleNNModel  # noqa: E402
+
+
+@pytest.fixture(scope='module', params=[{}, {'hidden_size': 4, 'activation': 'relu'}, {'activation': 'tanh'}])
+def models(request, tmp_path_factory):
+    model_path = str(tmp_path_factory.mktemp('model'))
+    keras_model = SimpleNNModel(model_path, **request.param)
+    keras_model.export_weights()
+    return keras_model, NumpyNNModel(model_path)
+
+
+def test_scores_match_keras_for_batch(models):
+    keras_model, numpy_model = models
+    batch = KeypointsBatch.from_keypoints_list(generate_keypoints(np.random.RandomState(0), 100))
+    features = SimpleNNModel.PREPROCESSING_PIPELINE.run_array(batch).astype(np.float32)
+
+    np.testing.assert_allclose(numpy_model.predict_scores(features), keras_model.predict_scores(features),
+                               rtol=1e-5, atol=1e-6)
+
+
+def test_scores_match_keras_for_single_sample(models):
+    keras_model, numpy_model = models
+    keypoints = generate_keypoints(np.random.RandomState(1), 1)[0]
+    features = SimpleNNModel.PREPROCESSING_PIPELINE.run_array(keypoints).astype(np.float32)
+
+    assert numpy_model.predict_scores(features).shape == (1,)
+    np.testing.assert_allclose(numpy_model.predict_scores(features), keras_model.predict_scores(features),
+                               rtol=1e-5, atol=1e-6)
+
+
+def test_predictions_match_keras(models):
+    keras_model, numpy_model = models
+    keypoints = generate_keypoints(np.random.RandomState(2), 100)
+    batch = KeypointsBatch.from_keypoints_list(keypoints)
+    scores = keras_model.predict_scores(SimpleNNModel.PREPROCESSING_PIPELINE.run_array(batch).astype(np.float32))
+
+    # Scores within float rounding of decision boundary may be classified differently
+    unambiguous = np.abs(scores - 0.5) > 1e-5
+    np.testing.assert_array_equal(numpy_model.predict(batch)[unambiguous], keras_model.predict(batch)[unambiguous])
+    assert numpy_model.predict(keypoints[0])[0] == keras_model.predict(keypoints[0])[0]
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from annotations import Keypoints, AnnotationBatch
+from annotation_storage import read_annotations, write_annotations
+from benchmarks.micro_benchmarks import generate_annotations
+from posture_detection.preprocessing import KEYPOINTS_PREPROCESSING_PIPELINE, PreProcessingPipeline, \
+    NormalizePointCoordinatesToBoundingBox, PointsToVectors, FilterColumns
+
+
+def create_annotations_data_frame(count, seed=0) -> pd.DataFrame:
+    annotations = generate_annotations(np.random.RandomState(seed), count)
+    data_frame = AnnotationBatch.from_annotations_list(annotations).to_dataframe()
+
+    # Undetected points are stored as NaN
+    data_frame.loc[1, ['nose_x', 'nose_y']] = np.nan
+    data_frame.loc[2, Keypoints.get_point_attribute_name(coordinate='y')[:5]] = np.nan
+    return data_frame
+
+
+def assert_batch_equals_rows(pipeline: PreProcessingPipeline, data_frame: pd.DataFrame):
+    batch_result = pipeline.run_batch(data_frame)
+    rows_result = pipeline.run_rows(data_frame)
+
+    assert list(batch_result.columns) == list(rows_result.columns)
+    assert list(batch_result.index) == list(rows_result.index)
+    np.testing.assert_array_equal(batch_result.to_numpy(dtype=np.float64), rows_result.to_numpy(dtype=np.float64))
+
+
+@pytest.mark.parametrize('pipeline', [
+    KEYPOINTS_PREPROCESSING_PIPELINE,
+    PreProcessingPipeline([FilterColumns(Keypoints.ATTRIBUTE_NAMES), NormalizePointCoordinatesToBoundingBox()]),
+    PreProcessingPipeline([FilterColumns(Keypoints.BODY_POINTS_ATTRIBUTE_NAMES), PointsToVectors()])
+])
+def test_run_batch_equals_run_rows(pipeline):
+    data_frame = create_annotations_data_frame(20)
+    data_frame.index = data_frame.index + 100
+
+    assert_batch_equals_rows(pipeline, data_frame)
+
+
+def test_run_batch_equals_run_rows_on_csv_round_trip(tmp_path):
+    annotations_file_path = str(tmp_path / 'annotations.csv')
+    write_annotations(create_annotations_data_frame(20), annotations_file_path)
+
+    assert_batch_equals_rows(KEYPOINTS_PREPROCESSING_PIPELINE, read_annotations(annotations_file_path))
+
+
+def test_run_array_equals_run_batch():
+    data_frame = create_annotations_data_frame(20)
+
+    np.testing.assert_array_equal(KEYPOINTS_PREPROCESSING_PIPELINE.run_array(data_frame),
+                                  KEYPOINTS_PREPROCESSING_PIPELINE.run_batch(data_frame).to_numpy())
+
+
+def test_nan_points_stay_nan():
+    data_frame = create_annotations_data_frame(5)
+    result = KEYPOINTS_PREPROCESSING_PIPELINE.run_batch(data_frame)
+
+    assert result.loc[1, ['nose_x', 'nose_y']].isna().all()
+    assert not result.loc[0].isna().any()
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from annotations import AnnotationBatch
+from annotation_storage import read_annotations_in_chunks, write_annotations
+from benchmarks.micro_benchmarks import generate_annotations
+from posture_detection.preprocessing import KEYPOINTS_PREPROCESSING_PIPELINE
+from posture_detection.streaming_dataset import SPLIT_KEY_COLUMN, is_test_sample, iterate_preprocessed_chunks
+
+
+@pytest.fixture
+def annotations_file_path(tmp_path):
+    annotations = generate_annotations(np.random.RandomState(0), 60)
+    data_frame = AnnotationBatch.from_annotations_list(annotations).to_dataframe()
+    # Several persons are detected in every image
+    data_frame[SPLIT_KEY_COLUMN] = [f'images/{i // 3:04d}.jpg' for i in range(len(data_frame))]
+
+    annotations_file_path = str(tmp_path / 'annotations.npann')
+    write_annotations(data_frame, annotations_file_path)
+    return annotations_file_path
+
+
+def get_test_samples(annotations_file_path, chunk_size):
+    chunks = list(read_annotations_in_chunks(annotations_file_path, chunk_size, columns=[SPLIT_KEY_COLUMN]))
+    return np.concatenate([is_test_sample(chunk[SPLIT_KEY_COLUMN], test_size=0.5) for chunk in chunks])
+
+
+def test_split_does_not_depend_on_chunk_size(annotations_file_path):
+    test_samples = get_test_samples(annotations_file_path, 60)
+
+    assert 0 < test_samples.sum() < len(test_samples)
+    for chunk_size in [1, 4, 7]:
+        np.testing.assert_array_equal(get_test_samples(annotations_file_path, chunk_size), test_samples)
+
+
+def test_split_keeps_persons_of_image_together(annotations_file_path):
+    # Chunk size not aligned with images, so persons of one image are split between chunks
+    chunks = read_annotations_in_chunks(annotations_file_path, 4, columns=[SPLIT_KEY_COLUMN])
+    split_keys = pd.concat(chunks, ignore_index=True)[SPLIT_KEY_COLUMN]
+    test_samples = pd.Series(get_test_samples(annotations_file_path, 4))
+
+    assert (test_samples.groupby(split_keys).nunique() == 1).all()
+
+
+@pytest.mark.parametrize('subset', ['train', 'test'])
+def test_preprocessed_chunks_do_not_depend_on_chunk_size(annotations_file_path, subset):
+    def read_subset(chunk_size):
+        chunks = list(iterate_preprocessed_chunks(annotations_file_path, KEYPOINTS_PREPROCESSING_PIPELINE,
+                                                  chunk_size, 0.5, subset))
+        return np.concatenate([features for features, _ in chunks]), np.concatenate([labels for _, labels in chunks])
+
+    features, labels = read_subset(60)
+    for chunk_size in [1, 7]:
+        chunk_features, chunk_labels = read_subset(chunk_size)
+        np.testing.assert_array_equal(chunk_features, features)
+        np.testing.assert_array_equal(chunk_labels, labels)